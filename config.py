@@ -1,5 +1,7 @@
 # MII4_60_Python/config.py
 
+import os
+
 # Ключевые параметры алгоритма
 DEFAULT_STEPS = 3
 DEFAULT_LAMBDA = 7500  # Длина волны в Å
@@ -9,6 +11,7 @@ DEFAULT_DELAY = 300     # Задержка в мс
 # Настройки камеры
 DEFAULT_CAMERA_RESOLUTION = (640, 480)
 DEFAULT_CAMERA_FPS = 30
+CAMERA_FRAME_TIMEOUT = 1.0  # Сколько секунд измерение ждет новый кадр после задержки шага
 
 # Настройки Arduino
 DEFAULT_ARDUINO_BAUDRATE = 57600
@@ -16,14 +19,32 @@ ARDUINO_PINS = list(range(2, 11))  # Пины 2-10 для управления
 BLINK_PIN = 13
 ESP_BLINK_PIN = 2
 ESP_LED_INVERTED = True
+ARDUINO_STEP_ACK = False  # Прошивка (serial) отвечает ARDUINO_STEP_ACK_TOKEN, когда шаг установился
+ARDUINO_STEP_ACK_TOKEN = b"OK\n"
 
 # Настройки обработки
 DEFAULT_DELIMITER = 10  # Разделитель для специального unwrap
 MAX_TILES_SIZE = (1000, 1000)  # Максимальный размер для tiles массива
+PHASE_TILE_WORKERS = os.cpu_count() or 1  # Потоки обработки тайлов в tile_unwrap
+PHASE_UNWRAP_TILED_MIN_PIXELS = 4_000_000  # С какого размера unwrap_phase разворачивает изображение по тайлам
+PHASE_UNWRAP_TILES = (2, 2)  # Сетка тайлов (строки, столбцы) для развёртки больших изображений
+PHASE_UNWRAP_OVERLAP = 32  # Перекрытие тайлов в пикселях для сшивки по стыкам
 
 # Настройки DPI записи
 DPI_IMAGE_FORMAT = "PNG"
+DPI_PNG_COMPRESSION = 1  # Уровень zlib 0-9: 1 кодирует в разы быстрее 9 при близком размере
 DPI_CSV_FORMAT = "CSV"
+DPI_NPY_FORMAT = "NPY"
+DPI_BIN_FORMAT = "BIN"
+DPI_RAW_FORMAT = "RAW"
+DPI_DATA_FORMAT = DPI_CSV_FORMAT  # CSV читается Java-версией, NPY/BIN/RAW - компактные бинарные форматы
+DPI_BIN_FILE = "frames.bin"  # Файл сессии для формата BIN
+DPI_RAW_FILE = "frames.raw"  # Файл сессии для формата RAW (кадры float32 одного размера подряд)
+DPI_RAW_INDEX_FILE = "frames_index.txt"  # Количество и размер кадров в frames.raw
+DPI_RAW_PREALLOC_FRAMES = 64  # На сколько кадров за раз увеличивается frames.raw
+DPI_BATCH_SIZE = 16  # Максимум кадров, записываемых за один проход потока записи
+DPI_QUEUE_SIZE = 64  # Максимум кадров, ожидающих записи; лишние кадры отбрасываются
+DPI_WRITER_THREADS = max(1, (os.cpu_count() or 2) // 2)  # Потоки записи CSV-файлов
 
 # Настройки интерферограмм
 INTERFEROGRAM_METHODS = ["average", "first", "last"]
@@ -40,3 +61,5 @@ COLORMAP_SIZE = 1280  # Размер цветовой палитры
 # Настройки GUI
 GUI_WINDOW_SIZE = (800, 600)
 CONTROLS_PANEL_WIDTH = 300
+GUI_DISPLAY_INTERVAL_MS = 33  # Минимальный интервал перерисовки кадров измерения (~30 Гц)
+GUI_USE_OPENGL = True  # Основной вид рисуется через OpenGL: масштабирование кадра выполняет GPU
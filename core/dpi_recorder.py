@@ -6,11 +6,32 @@ DPI Recorder - модуль для записи последовательнос
 import os
 import time
 import numpy as np
-from datetime import datetime
-import csv
+import cv2
 from PySide6.QtCore import QObject, Signal
 import threading
 import queue
+import struct
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+import config
+from core.visualizer import format_csv
+
+
+# Предел числа буферов в одном вызове writev (IOV_MAX, в Linux 1024)
+_IOV_MAX = 1024
+
+
+def _writev_all(fd, parts):
+    """Записывает буферы parts через os.writev, дописывая остаток при частичной записи."""
+    parts = [memoryview(part).cast('B') for part in parts]
+    while parts:
+        written = os.writev(fd, parts[:_IOV_MAX])
+        # Пропускаем полностью записанные буферы и обрезаем частично записанный
+        while parts and written >= len(parts[0]):
+            written -= len(parts[0])
+            parts.pop(0)
+        if written:
+            parts[0] = parts[0][written:]
 
 
 class DPIRecorder(QObject):
@@ -20,8 +41,9 @@ class DPIRecorder(QObject):
     
     # Сигналы для обновления GUI
     recording_started = Signal()
-    recording_stopped = Signal()
-    image_saved = Signal(int, str)  # номер изображения, путь к файлу
+    recording_stopped = Signal(int)  # количество кадров, пропущенных из-за переполнения очереди
+    image_saved = Signal(int, str)  # номер изображения, путь к файлу (только при emit_per_frame)
+    images_saved_batch = Signal(list)  # [(номер, путь), ...] - один сигнал на записанную пачку
     error_occurred = Signal(str)
     values_ready = Signal(str)
     
@@ -32,11 +54,32 @@ class DPIRecorder(QObject):
         self.image_count = 0
         self.start_time = None
         self.params = {}
-        self._queue = queue.Queue()
+        # Один производитель и один потребитель: SimpleQueue дешевле Queue (без condition/task_done).
+        # Размер ограничивается в save_phase_data: если запись отстаёт, кадры отбрасываются
+        self._queue = queue.SimpleQueue()
+        self.dropped_frames = 0
+        # Идёт ли серия пропусков: об ошибке сообщается один раз на серию, а не на каждый кадр
+        self._overflowing = False
         self._writer_thread = None
-        self._stop_event = threading.Event()
+        self._finalizer = None
+        # Сбрасывать is_recording и запускать финализацию может только один путь:
+        # stop_recording либо ошибка в потоке записи
+        self._stop_lock = threading.Lock()
+        # Посылать ли image_saved на каждый кадр в дополнение к images_saved_batch
+        self.emit_per_frame = False
         self._writing = False
         self._experiment_finished = False
+        self.data_format = config.DPI_DATA_FORMAT
+        self._stream_fd = None
+        # Состояние формата RAW: файл кадров фиксированного размера, отображённый в память
+        self._raw_fd = None
+        self._raw_map = None
+        self._raw_shape = None
+        self._raw_count = 0
+        self._raw_capacity = 0
+        # CSV-файлы кадров независимы, поэтому пачка записывается параллельно.
+        # Пул создаётся на время записи и закрывается при её финализации
+        self._executor = None
         
     def start_recording(self, output_directory, params=None):
         """
@@ -47,6 +90,10 @@ class DPIRecorder(QObject):
         """
         if self.is_recording:
             return False
+        # Предыдущая сессия должна полностью завершиться до начала новой
+        if self._finalizer is not None:
+            self._finalizer.join()
+            self._finalizer = None
             
         # Создаем папку если она не существует
         try:
@@ -54,17 +101,32 @@ class DPIRecorder(QObject):
             self.output_directory = output_directory
             self.is_recording = True
             self.image_count = 0
+            self.dropped_frames = 0
+            self._overflowing = False
             self.start_time = time.time()
             self.params = params or {}
+            self.data_format = self.params.get('data_format', config.DPI_DATA_FORMAT)
             while not self._queue.empty():
                 try:
                     self._queue.get_nowait()
                 except Exception:
                     break
-            self._stop_event.clear()
             self._experiment_finished = False
+            if self.data_format == config.DPI_BIN_FORMAT:
+                # Один файл на всю сессию: пачка кадров дописывается одним os.write без open/close на кадр
+                flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+                self._stream_fd = os.open(os.path.join(output_directory, config.DPI_BIN_FILE), flags, 0o644)
+            elif self.data_format == config.DPI_RAW_FORMAT:
+                # Размер кадра станет известен с первым кадром, тогда же файл будет отображён в память
+                flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+                self._raw_fd = os.open(os.path.join(output_directory, config.DPI_RAW_FILE), flags, 0o644)
+                self._raw_shape = None
+                self._raw_count = 0
+                self._raw_capacity = 0
+            self._executor = ThreadPoolExecutor(max_workers=config.DPI_WRITER_THREADS,
+                                                thread_name_prefix="dpi-writer")
             if self._writer_thread is None or not self._writer_thread.is_alive():
-                self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer_thread = threading.Thread(target=self._writer_loop, name="dpi-writer-loop", daemon=True)
                 self._writer_thread.start()
             
             self.recording_started.emit()
@@ -74,62 +136,259 @@ class DPIRecorder(QObject):
             self.error_occurred.emit(f"Ошибка создания папки: {str(e)}")
             return False
     
-    def stop_recording(self):
+    def stop_recording(self, wait=False):
+        """
+        Останавливает DPI запись. Дозапись очереди и создание values.txt выполняются
+        в фоновом потоке, чтобы не блокировать GUI; по завершении испускается recording_stopped.
+        
+        Args:
+            wait: дождаться завершения финализации (например, при закрытии приложения)
         """
-        Останавливает DPI запись
+        if self._begin_finalize():
+            # Маркер конца очереди: поток записи дописывает всё, что стоит перед ним, и сразу завершается
+            self._queue.put(None)
+        # Финализация могла быть запущена и потоком записи после ошибки - ждём её в любом случае
+        finalizer = self._finalizer
+        if wait and finalizer is not None:
+            finalizer.join()
+
+    def _begin_finalize(self):
         """
-        if not self.is_recording:
-            return
-            
-        self.is_recording = False
-        self._stop_event.set()
+        Атомарно сбрасывает is_recording и запускает поток финализации.
+        Возвращает False, если запись уже остановлена (финализация запущена другим путём).
+        """
+        with self._stop_lock:
+            if not self.is_recording:
+                return False
+            self.is_recording = False
+            self._finalizer = threading.Thread(target=self._finalize_recording, name="dpi-finalizer", daemon=True)
+            self._finalizer.start()
+            return True
+
+    def _finalize_recording(self):
         t = self._writer_thread
         if t is not None:
-            t.join(timeout=10)
+            t.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._close_stream()
+        self._close_raw()
         # Значение записывается после завершения эксперимента либо здесь, если запись остановлена вручную
         self.create_values_file()
-        self.recording_stopped.emit()
+        self.recording_stopped.emit(self.dropped_frames)
     
     def save_phase_data(self, phase_data, phase_image=None):
+        """
+        Ставит кадр в очередь записи. Изображение фазы (если передано) кодируется
+        в PNG в потоке записи, а не в вызывающем (GUI) потоке.
+        """
         if not self.is_recording or phase_data is None:
             return
+        if self._queue.qsize() >= config.DPI_QUEUE_SIZE:
+            self.dropped_frames += 1
+            if not self._overflowing:
+                self._overflowing = True
+                self.error_occurred.emit(
+                    f"DPI: очередь записи заполнена, кадры пропускаются (всего пропущено {self.dropped_frames})")
+            return
+        self._overflowing = False
         try:
-            self._queue.put_nowait(phase_data)
+            self._queue.put_nowait((phase_data, phase_image))
         except Exception as e:
             self.error_occurred.emit(f"Ошибка постановки в очередь: {str(e)}")
     
+    def _save_phase_batch(self, batch, first_num):
+        """
+        Сохраняет пачку фазовых кадров и возвращает путь к файлу для каждого кадра.
+        CSV совместим с Java-версией (файл на кадр), NPY - один бинарный .npz архив на пачку,
+        BIN - запись кадров в общий поток сессии, RAW - копирование в файл, отображённый в память.
+        """
+        frames = [np.asarray(phase_data) for phase_data, _ in batch]
+        images = [(num, phase_image) for num, (_, phase_image) in enumerate(batch, start=first_num)
+                  if phase_image is not None]
+        if images:
+            image_paths = [os.path.join(self.output_directory, f"test{num}.png") for num, _ in images]
+            list(self._executor.map(self._save_phase_image, [img for _, img in images], image_paths))
+        if self.data_format == config.DPI_NPY_FORMAT:
+            last_num = first_num + len(frames) - 1
+            npz_path = os.path.join(self.output_directory, f"test{first_num}-{last_num}.npz")
+            self._save_phase_to_npz(frames, first_num, npz_path)
+            return [npz_path] * len(frames)
+        if self.data_format in (config.DPI_BIN_FORMAT, config.DPI_RAW_FORMAT):
+            # BIN и RAW по формату хранят float32; для float32 входа массив не копируется.
+            # CSV и NPY пишутся в исходном типе данных, как в базовой версии
+            frames = [frame.astype(np.float32, copy=False) for frame in frames]
+            if self.data_format == config.DPI_BIN_FORMAT:
+                return self._append_phase_frames(frames)
+            return self._copy_phase_frames_to_map(frames)
+        csv_paths = [os.path.join(self.output_directory, f"test{num}.csv")
+                     for num in range(first_num, first_num + len(frames))]
+        return list(self._executor.map(self._save_phase_to_csv, frames, csv_paths))
+
+    def _save_phase_image(self, phase_image, image_path):
+        """Сохраняет изображение фазы в PNG с быстрой (слабой) компрессией."""
+        if isinstance(phase_image, np.ndarray):
+            ok = cv2.imwrite(image_path, phase_image, [cv2.IMWRITE_PNG_COMPRESSION, config.DPI_PNG_COMPRESSION])
+        else:
+            # QImage: Qt переводит качество в уровень zlib как (100 - quality) * 9 // 91,
+            # поэтому берётся наибольшее качество, дающее уровень DPI_PNG_COMPRESSION
+            # (уровень 1 -> 89; качество 90 и выше означает запись без сжатия)
+            quality = 100 - (91 * config.DPI_PNG_COMPRESSION + 8) // 9
+            ok = phase_image.save(image_path, config.DPI_IMAGE_FORMAT, quality)
+        if not ok:
+            self.error_occurred.emit(f"Ошибка сохранения PNG: {image_path}")
+        return image_path
+
+    def _append_phase_frames(self, frames):
+        """
+        Дописывает кадры в открытый файл сессии.
+        Формат записи кадра: заголовок '<II' (строки, столбцы) и данные float32 в C-порядке.
+        """
+        bin_path = os.path.join(self.output_directory, config.DPI_BIN_FILE)
+        try:
+            parts = []
+            for frame in frames:
+                frame = np.ascontiguousarray(frame)
+                parts.append(struct.pack('<II', *frame.shape))
+                parts.append(memoryview(frame).cast('B'))
+            if hasattr(os, 'writev'):
+                # Заголовки и данные кадров уходят одним системным вызовом без склейки в общий буфер
+                _writev_all(self._stream_fd, parts)
+            else:
+                # В Windows нет writev: пачка склеивается и пишется обычным write
+                buf = memoryview(b''.join(parts))
+                while buf:
+                    buf = buf[os.write(self._stream_fd, buf):]
+        except OSError as e:
+            self.error_occurred.emit(f"Ошибка записи BIN: {str(e)}")
+        return [bin_path] * len(frames)
+
+    def _copy_phase_frames_to_map(self, frames):
+        """
+        Копирует кадры напрямую в страницы файла frames.raw (без write() и буферов Python).
+        Все кадры сессии должны иметь одинаковый размер; файл растёт блоками по
+        config.DPI_RAW_PREALLOC_FRAMES кадров, лишнее обрезается при остановке.
+        """
+        raw_path = os.path.join(self.output_directory, config.DPI_RAW_FILE)
+        try:
+            for frame in frames:
+                if self._raw_shape is None:
+                    self._raw_shape = frame.shape
+                if frame.shape != self._raw_shape:
+                    self.error_occurred.emit(
+                        f"Ошибка записи RAW: размер кадра {frame.shape} не совпадает с {self._raw_shape}")
+                    continue
+                frame_bytes = frame.nbytes
+                if self._raw_count == self._raw_capacity:
+                    self._grow_raw_map(frame_bytes)
+                offset = self._raw_count * frame_bytes
+                self._raw_map[offset:offset + frame_bytes] = memoryview(np.ascontiguousarray(frame)).cast('B')
+                self._raw_count += 1
+        except OSError as e:
+            self.error_occurred.emit(f"Ошибка записи RAW: {str(e)}")
+        return [raw_path] * len(frames)
+
+    def _grow_raw_map(self, frame_bytes):
+        if self._raw_map is not None:
+            self._raw_map.close()
+        self._raw_capacity += config.DPI_RAW_PREALLOC_FRAMES
+        os.ftruncate(self._raw_fd, self._raw_capacity * frame_bytes)
+        self._raw_map = mmap.mmap(self._raw_fd, self._raw_capacity * frame_bytes, access=mmap.ACCESS_WRITE)
+
+    def _close_raw(self):
+        """Закрывает frames.raw, обрезает незаполненный хвост и пишет индекс с размером кадров."""
+        if self._raw_fd is None:
+            return
+        try:
+            if self._raw_map is not None:
+                self._raw_map.close()
+            rows, cols = self._raw_shape or (0, 0)
+            os.ftruncate(self._raw_fd, self._raw_count * rows * cols * np.dtype(np.float32).itemsize)
+            os.close(self._raw_fd)
+            index_path = os.path.join(self.output_directory, config.DPI_RAW_INDEX_FILE)
+            with open(index_path, 'w', encoding='utf-8') as f:
+                f.write(f"Frames: {self._raw_count}\nRows: {rows}\nCols: {cols}\nDtype: float32\n")
+        except OSError as e:
+            self.error_occurred.emit(f"Ошибка закрытия RAW: {str(e)}")
+        self._raw_fd = None
+        self._raw_map = None
+
+    def _close_stream(self):
+        if self._stream_fd is None:
+            return
+        try:
+            os.close(self._stream_fd)
+        except OSError as e:
+            self.error_occurred.emit(f"Ошибка закрытия BIN: {str(e)}")
+        self._stream_fd = None
+
+    def _save_phase_to_npz(self, frames, first_num, npz_path):
+        """Сохраняет пачку кадров в один .npz архив (ключи test{n}), открывая файл один раз."""
+        try:
+            np.savez(npz_path, **{f"test{num}": frame for num, frame in enumerate(frames, start=first_num)})
+        except OSError as e:
+            self.error_occurred.emit(f"Ошибка сохранения NPY: {str(e)}")
+        return npz_path
+
     def _save_phase_to_csv(self, phase_data, csv_path):
         """
         Сохраняет фазовые данные в CSV файл.
         ИСПРАВЛЕНО: сохранение float вместо int для совместимости с Java.
         """
         try:
-            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
             # Java код считывает float (t.getFloat), поэтому сохраняем с точностью
             # np.rint и int64 удалены, чтобы не терять фазовую информацию
-            np.savetxt(csv_path, phase_data, fmt='%.6f', delimiter=',')
-        except Exception as e:
+            # Весь файл форматируется в памяти и записывается одним вызовом write()
+            with open(csv_path, 'wb') as f:
+                f.write(format_csv(phase_data, fmt='%.6f', delimiter=','))
+        except OSError as e:
             self.error_occurred.emit(f"Ошибка сохранения CSV: {str(e)}")
+        return csv_path
     
     def _writer_loop(self):
-        while not self._stop_event.is_set() or not self._queue.empty():
-            try:
-                phase_data = self._queue.get(timeout=0.5)
-            except queue.Empty:
-                continue
+        try:
+            self._write_queue()
+        except Exception as e:
+            # Непредвиденная ошибка (не ввода-вывода) останавливает запись, а не молча
+            # завершает поток: иначе кадры копились бы в очереди и отбрасывались
+            self._writing = False
+            self.error_occurred.emit(f"Ошибка записи, запись остановлена: {str(e)}")
+            # Файлы сессии закрываются так же, как при обычной остановке. Если остановка уже
+            # запрошена, финализацию запустил stop_recording, и второй поток не нужен
+            self._begin_finalize()
+
+    def _write_queue(self):
+        stopping = False
+        while not stopping:
+            # Ожидание без таймаута и периодических пробуждений: stop_recording будит поток маркером None
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Забираем уже накопившиеся кадры, чтобы записать их за один проход
+            while len(batch) < config.DPI_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
             try:
                 self._writing = True
-                num = self.image_count + 1
-                base_filename = f"test{num}"
-                csv_path = os.path.join(self.output_directory, f"{base_filename}.csv")
-                self._save_phase_to_csv(phase_data, csv_path)
-                self.image_count = num
-                self.image_saved.emit(self.image_count, csv_path)
-            except Exception as e:
+                first_num = self.image_count + 1
+                saved = list(enumerate(self._save_phase_batch(batch, first_num), start=first_num))
+                self.image_count = saved[-1][0]
+                if self.emit_per_frame:
+                    for num, saved_path in saved:
+                        self.image_saved.emit(num, saved_path)
+                self.images_saved_batch.emit(saved)
+            except OSError as e:
                 self.error_occurred.emit(f"Ошибка записи: {str(e)}")
             finally:
                 self._writing = False
-                self._queue.task_done()
             # Если эксперимент завершён и очередь пуста - пишем values
             if self._experiment_finished and self._queue.empty():
                 try:
@@ -168,6 +427,7 @@ class DPIRecorder(QObject):
             'is_recording': self.is_recording,
             'output_directory': self.output_directory,
             'image_count': self.image_count,
+            'dropped_frames': self.dropped_frames,
             'elapsed_time': elapsed_time
         }
     
@@ -187,13 +447,19 @@ class DPIRecorder(QObject):
             threshold = float(self.params.get('threshold', 0.0))
             delay = int(self.params.get('delay', 0))
             
+            # Java использует split(" "), поэтому важен ровно один пробел между ключами и значениями
+            content = (
+                f"Time ms: {elapsed_ms}\n"        # Было "Time ms:  {val}" -> Java читала пустую строку вместо числа
+                f"Quantity: {self.image_count}\n"  # Было "Quantity:  {val}"
+                f"Algorythm: {steps} step\n"
+                f"Wavelagth: {wavelength:.1f}\n"
+                f"Threshold: {threshold}\n"
+                f"Delay: {delay}\n"
+            )
+            if self.dropped_frames:
+                # Строка добавляется только при потерях, чтобы не менять файл полной записи
+                content += f"Dropped: {self.dropped_frames}\n"
             with open(values_path, 'w', encoding='utf-8') as f:
-                # Java использует split(" "), поэтому важен ровно один пробел между ключами и значениями
-                f.write(f"Time ms: {elapsed_ms}\n")      # Было "Time ms:  {val}" -> Java читала пустую строку вместо числа
-                f.write(f"Quantity: {self.image_count}\n") # Было "Quantity:  {val}"
-                f.write(f"Algorythm: {steps} step\n")
-                f.write(f"Wavelagth: {wavelength:.1f}\n")
-                f.write(f"Threshold: {threshold}\n")
-                f.write(f"Delay: {delay}\n")
+                f.write(content)
         except Exception as e:
             self.error_occurred.emit(f"Ошибка создания values: {str(e)}")
\ No newline at end of file
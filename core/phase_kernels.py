@@ -0,0 +1,181 @@
+# MII4_60_Python/core/phase_kernels.py
+"""
+Скомпилированные (Numba) ядра для обработки фазы.
+Numba - необязательная зависимость: если её нет, HAS_NUMBA = False,
+и PhaseProcessor использует векторизированные NumPy-версии.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except Exception:
+    HAS_NUMBA = False
+
+# Ширина полосы столбцов для вертикального прохода (64 float32 = 256 байт на строку)
+VERTICAL_STRIP = 64
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def threshold_unwrap_kernel(h, limit, step, iterations, horizontal, vertical):
+        """
+        Пороговая развёртка на месте. Каждая строка (столбец) - независимая цепочка
+        с накапливаемой поправкой, поэтому строки (столбцы) обрабатываются параллельно.
+        Скачок определяется по исходной разнице соседей, как в векторизированной версии.
+        Поправка накапливается целым числом полупериодов k, чтобы не копить ошибку округления.
+        """
+        rows, cols = h.shape
+        for _ in range(iterations):
+            if horizontal:
+                for y in prange(rows):
+                    k = 0
+                    last = h[y, 0]
+                    for x in range(1, cols):
+                        cur = h[y, x]
+                        diff = cur - last
+                        if diff > limit:
+                            k -= 1
+                        elif diff < -limit:
+                            k += 1
+                        last = cur
+                        h[y, x] = cur + k * step
+            if vertical:
+                # Столбцы обрабатываются полосами по VERTICAL_STRIP: внутри полосы строки читаются
+                # подряд по памяти, а поправки и предыдущие значения столбцов полосы лежат в L1
+                for s in prange((cols + VERTICAL_STRIP - 1) // VERTICAL_STRIP):
+                    x0 = s * VERTICAL_STRIP
+                    width = min(VERTICAL_STRIP, cols - x0)
+                    k = np.zeros(width, dtype=np.int64)
+                    last = h[0, x0:x0 + width].copy()
+                    for y in range(1, rows):
+                        for i in range(width):
+                            cur = h[y, x0 + i]
+                            diff = cur - last[i]
+                            if diff > limit:
+                                k[i] -= 1
+                            elif diff < -limit:
+                                k[i] += 1
+                            last[i] = cur
+                            h[y, x0 + i] = cur + k[i] * step
+
+    @njit(nogil=True, fastmath=True, cache=True)
+    def threshold_unwrap_tile_kernel(h, limit, step, iterations, horizontal, vertical):
+        """
+        Последовательный вариант threshold_unwrap_kernel для небольших тайлов.
+        Отпускает GIL и не запускает собственных потоков Numba, поэтому его можно
+        вызывать одновременно из нескольких потоков ThreadPoolExecutor.
+        """
+        rows, cols = h.shape
+        for _ in range(iterations):
+            if horizontal:
+                for y in range(rows):
+                    k = 0
+                    last = h[y, 0]
+                    for x in range(1, cols):
+                        cur = h[y, x]
+                        diff = cur - last
+                        if diff > limit:
+                            k -= 1
+                        elif diff < -limit:
+                            k += 1
+                        last = cur
+                        h[y, x] = cur + k * step
+            if vertical:
+                for x in range(cols):
+                    k = 0
+                    last = h[0, x]
+                    for y in range(1, rows):
+                        cur = h[y, x]
+                        diff = cur - last
+                        if diff > limit:
+                            k -= 1
+                        elif diff < -limit:
+                            k += 1
+                        last = cur
+                        h[y, x] = cur + k * step
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def special_unwrap_kernel(p, tiles_mask, row_tile, col_tile, limit, step, iterations):
+        """
+        Специальная развёртка на месте с учетом маски плиток tiles_mask[Y_idx, X_idx].
+        row_tile/col_tile - номер тайла для каждой строки/столбца (-1 за последним полным тайлом).
+        Скачок на пикселе из "плохого" тайла не добавляет поправку; пиксели с номером -1
+        считаются "хорошими". Строки, затем столбцы обрабатываются параллельно.
+        Если за итерацию не найдено ни одного скачка, данные уже не изменятся, и цикл прерывается.
+        """
+        rows, cols = p.shape
+        for _ in range(iterations):
+            jumps = 0
+            for y in prange(rows):
+                ty = row_tile[y]
+                k = 0
+                last = p[y, 0]
+                for x in range(1, cols):
+                    cur = p[y, x]
+                    diff = cur - last
+                    tx = col_tile[x]
+                    if not (ty >= 0 and tx >= 0 and tiles_mask[ty, tx]):
+                        if diff > limit:
+                            k -= 1
+                            jumps += 1
+                        elif diff < -limit:
+                            k += 1
+                            jumps += 1
+                    last = cur
+                    p[y, x] = cur + k * step
+            for x in prange(cols):
+                tx = col_tile[x]
+                k = 0
+                last = p[0, x]
+                for y in range(1, rows):
+                    cur = p[y, x]
+                    diff = cur - last
+                    ty = row_tile[y]
+                    if not (ty >= 0 and tx >= 0 and tiles_mask[ty, tx]):
+                        if diff > limit:
+                            k -= 1
+                            jumps += 1
+                        elif diff < -limit:
+                            k += 1
+                            jumps += 1
+                    last = cur
+                    p[y, x] = cur + k * step
+            if jumps == 0:
+                break
+
+    @njit(nogil=True, fastmath=True, cache=True)
+    def phase_jump_kernel(tile, limit):
+        """
+        Проверка скачков фазы в тайле: True при первой паре соседей (по строке или
+        по столбцу) с разницей больше limit, без построения массивов разностей.
+        """
+        rows, cols = tile.shape
+        for y in range(rows):
+            for x in range(1, cols):
+                if abs(tile[y, x] - tile[y, x - 1]) > limit:
+                    return True
+        for y in range(1, rows):
+            for x in range(cols):
+                if abs(tile[y, x] - tile[y - 1, x]) > limit:
+                    return True
+        return False
+
+    # Без fastmath: он разрешает заменять деление умножением на обратное значение
+    @njit(parallel=True, cache=True)
+    def phase_to_gray_kernel(phase, min_val, value_range, out):
+        """
+        Нормировка фазы в оттенки серого за один проход: out = clip((phase - min_val) / value_range * 255, 0, 255)
+        с отбрасыванием дробной части, как astype(np.uint8) в NumPy-версии.
+        Порядок операций тот же, что в NumPy-версии: при умножении на заранее вычисленный
+        255 / value_range максимум мог бы дать 254.99... и стать 254 вместо 255.
+        """
+        rows, cols = phase.shape
+        for y in prange(rows):
+            for x in range(cols):
+                v = (phase[y, x] - min_val) / value_range * 255.0
+                if v < 0.0:
+                    v = 0.0
+                elif v > 255.0:
+                    v = 255.0
+                out[y, x] = np.uint8(v)
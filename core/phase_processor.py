@@ -1,103 +1,285 @@
 # MII4_60_Python/core/phase_processor.py
 
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from skimage.restoration import unwrap_phase
+import config
+from core.phase_kernels import HAS_NUMBA
+if HAS_NUMBA:
+    from core.phase_kernels import threshold_unwrap_kernel, threshold_unwrap_tile_kernel, special_unwrap_kernel, phase_jump_kernel
+
+# CuPy - необязательная зависимость для развёртки фазы на GPU (unwrap_phase_gpu)
+try:
+    import cupy as cp
+    HAS_CUPY = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    cp = None
+    HAS_CUPY = False
+
+_S3 = np.sqrt(3)
+# Целые коэффициенты числителя (строка 0) и знаменателя (строка 1) формул compute_phase при I[0..steps-1]
+# и множители sqrt(3), вынесенные за скобки: суммы целых коэффициентов по целым пикселям точны во float32,
+# поэтому при равных кадрах числитель и знаменатель получаются ровно нулевыми
+_PHASE_COEFFS = {
+    3: (np.array([[2, -3, 1],
+                  [0, 1, -1]], dtype=np.float32), (1.0, _S3)),
+    4: (np.array([[5, -5, -5, 5],
+                  [2, 1, -1, -2]], dtype=np.float32), (1.0, _S3)),
+    5: (np.array([[2, -3, -4, 0, 5],
+                  [8, 3, -4, -6, -1]], dtype=np.float32), (_S3, 1.0)),
+}
+
+@lru_cache(maxsize=16)
+def _morton_order(nx, ny):
+    """Возвращает индексы тайлов (X_idx, Y_idx) в порядке кривой Мортона (Z-order)."""
+    def morton_key(idx):
+        x, y = idx
+        key = 0
+        for bit in range(max(nx, ny).bit_length()):
+            key |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+        return key
+    return tuple(sorted(((x, y) for y in range(ny) for x in range(nx)), key=morton_key))
 
 class PhaseProcessor:
     """Выполняет все вычисления, связанные с фазой."""
     def __init__(self, lambda_angstrom=7500.0):
         self.lambda_angstrom = lambda_angstrom
         self.lambda_nm = lambda_angstrom / 10.0
+        # Пул для параллельной обработки тайлов, создается при первом обращении
+        self._tile_executor = None
+        # Рабочие буферы NumPy-версии threshold_unwrap, свои для каждого потока пула
+        self._scratch_buffers = threading.local()
+        # Собственные значения лапласиана для БПФ-развёртки, по модулю (numpy/cupy) и размеру
+        self._fft_k2_cache = {}
+
+    def _get_tile_executor(self):
+        if self._tile_executor is None:
+            self._tile_executor = ThreadPoolExecutor(max_workers=config.PHASE_TILE_WORKERS,
+                                                     thread_name_prefix="phase-tile")
+        return self._tile_executor
 
     def compute_phase(self, images, steps):
         """
         Вычисляет 'свёрнутую' фазу на основе серии изображений.
         Формулы соответствуют методическим указаниям (сдвиг 60 градусов).
         """
-        # Убедимся, что изображения в float для вычислений
-        # Векторизированная конвертация списка в массив сразу быстрее
-        I = np.array(images, dtype=np.float32)
-        
-        if steps == 3:
-            numerator = 2 * I[0] - 3 * I[1] + I[2]
-            denominator = np.sqrt(3) * (I[1] - I[2])
-        elif steps == 4:
-            numerator = 5 * (I[0] - I[1] - I[2] + I[3])
-            denominator = np.sqrt(3) * (2 * I[0] + I[1] - I[2] - 2 * I[3])
-        elif steps == 5:
-            numerator = np.sqrt(3) * (2 * I[0] - 3 * I[1] - 4 * I[2] + 5 * I[4])
-            denominator = 8 * I[0] + 3 * I[1] - 4 * I[2] - 6 * I[3] - I[4]
-        else:
-            raise ValueError("Поддерживаются только 3, 4, или 5 шагов.")     
+        if steps not in _PHASE_COEFFS:
+            raise ValueError("Поддерживаются только 3, 4, или 5 шагов.")
+
+        # Стек (steps, H, W) в float32. Готовый float32-массив такой формы используется без копирования,
+        # список кадров собирается в него за одну копию
+        I = np.asarray(images, dtype=np.float32)
+
+        # Числитель и знаменатель - одна свёртка коэффициентов со стеком (BLAS sgemv),
+        # без промежуточных массивов для каждого слагаемого
+        coeffs, (num_scale, den_scale) = _PHASE_COEFFS[steps]
+        numerator, denominator = np.tensordot(coeffs, I[:steps], axes=1)
+        if num_scale != 1.0:
+            numerator *= np.float32(num_scale)
+        if den_scale != 1.0:
+            denominator *= np.float32(den_scale)
             
+        # arctan2 считается во float32: NumPy 2.x выполняет его SIMD-циклом (в ~7 раз быстрее float64).
+        # В точке (0, 0) (засвеченные или тёмные пиксели) результат равен 0, а не NaN
         wrapped_phase = np.arctan2(numerator, denominator)
         return wrapped_phase
 
-    def unwrap_phase(self, wrapped_phase):
-        """Выполняет развёртку фазы."""
-        return unwrap_phase(wrapped_phase)
+    def unwrap_phase(self, wrapped_phase, ntiles=None, overlap=None):
+        """
+        Выполняет развёртку фазы.
+        Большие изображения (от config.PHASE_UNWRAP_TILED_MIN_PIXELS) делятся на ntiles=(ry, rx)
+        перекрывающихся тайлов, которые разворачиваются параллельно; на стыках тайлы
+        сдвигаются на целое число периодов 2*pi по медиане разницы в зоне перекрытия.
+        """
+        if ntiles is None:
+            if wrapped_phase.size < config.PHASE_UNWRAP_TILED_MIN_PIXELS:
+                return unwrap_phase(wrapped_phase)
+            ntiles = config.PHASE_UNWRAP_TILES
+        if overlap is None:
+            overlap = config.PHASE_UNWRAP_OVERLAP
+        ry, rx = ntiles
+        if ry * rx <= 1:
+            return unwrap_phase(wrapped_phase)
+
+        rows, cols = wrapped_phase.shape
+        y_edges = np.linspace(0, rows, ry + 1).astype(int)
+        x_edges = np.linspace(0, cols, rx + 1).astype(int)
+        # Для каждого тайла: основная область (y0, y1, x0, x1) и расширенная на overlap (ey0, ey1, ex0, ex1)
+        boxes = []
+        for i in range(ry):
+            for j in range(rx):
+                y0, y1, x0, x1 = y_edges[i], y_edges[i + 1], x_edges[j], x_edges[j + 1]
+                boxes.append((i, j, y0, y1, x0, x1,
+                              max(0, y0 - overlap), min(rows, y1 + overlap),
+                              max(0, x0 - overlap), min(cols, x1 + overlap)))
+
+        # Развёртка skimage отпускает GIL, поэтому тайлы обрабатываются потоками
+        tiles = list(self._get_tile_executor().map(
+            lambda box: unwrap_phase(wrapped_phase[box[6]:box[7], box[8]:box[9]]), boxes))
+
+        result = np.empty((rows, cols), dtype=tiles[0].dtype)
+        two_pi = 2 * np.pi
+        # Сшиваем в порядке растра: первый тайл строки - по верхнему соседу, остальные - по левому
+        for (i, j, y0, y1, x0, x1, ey0, ey1, ex0, ex1), tile in zip(boxes, tiles):
+            if j > 0:
+                reference = result[y0:y1, ex0:x0]
+                own = tile[y0 - ey0:y1 - ey0, 0:x0 - ex0]
+            elif i > 0:
+                reference = result[ey0:y0, x0:x1]
+                own = tile[0:y0 - ey0, x0 - ex0:x1 - ex0]
+            else:
+                reference = None
+            if reference is not None and reference.size:
+                k = np.round(np.median(reference - own) / two_pi)
+                tile += k * two_pi
+            result[y0:y1, x0:x1] = tile[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+        return result
+
+    def unwrap_phase_gpu(self, wrapped_phase):
+        """
+        Развёртка фазы на GPU (CuPy) методом наименьших квадратов через БПФ.
+        Без CuPy или без CUDA-устройства выполняется обычная unwrap_phase на CPU.
+        """
+        if not HAS_CUPY:
+            return self.unwrap_phase(wrapped_phase)
+        unwrapped = self._fft_unwrap(cp, cp.asarray(wrapped_phase, dtype=cp.float32))
+        return cp.asnumpy(unwrapped)
+
+    def _fft_unwrap(self, xp, psi):
+        """
+        Развёртка методом наименьших квадратов (Ghiglia, Romero) для модуля массивов xp (numpy или cupy):
+        уравнение Пуассона ∇²φ = div(wrap(∇ψ)) решается в частотной области на зеркально продолженной сетке.
+        Для фазы без особых точек результат совпадает с точной развёрткой с точностью до константы.
+        """
+        rows, cols = psi.shape
+        two_pi = 2 * np.pi
+        # Свёрнутые разности соседей; на границе разность 0 (условие Неймана)
+        dx = xp.zeros_like(psi)
+        dy = xp.zeros_like(psi)
+        dx[:, :-1] = psi[:, 1:] - psi[:, :-1]
+        dy[:-1, :] = psi[1:, :] - psi[:-1, :]
+        dx -= two_pi * xp.rint(dx / two_pi)
+        dy -= two_pi * xp.rint(dy / two_pi)
+        rho = dx + dy
+        rho[:, 1:] -= dx[:, :-1]
+        rho[1:, :] -= dy[:-1, :]
+        # Зеркальное продолжение до (2H, 2W): БПФ такой сетки диагонализует дискретный лапласиан с условием Неймана
+        ext = xp.concatenate([rho, rho[:, ::-1]], axis=1)
+        ext = xp.concatenate([ext, ext[::-1, :]], axis=0)
+        shape = ext.shape
+        spectrum = xp.fft.rfft2(ext) / self._fft_laplacian(xp, shape)
+        # Постоянная составляющая не определена
+        spectrum[0, 0] = 0
+        phi = xp.fft.irfft2(spectrum, s=shape)[:rows, :cols]
+        # Приводим результат к виду psi + 2*pi*k, чтобы он был конгруэнтен исходной фазе
+        return psi + two_pi * xp.rint((phi - psi) / two_pi)
+
+    def _fft_laplacian(self, xp, shape):
+        """Собственные значения дискретного лапласиана для rfft2 сетки shape (кэшируются)."""
+        key = (xp.__name__, shape)
+        eigen = self._fft_k2_cache.get(key)
+        if eigen is None:
+            ky = 2 * np.pi * np.fft.fftfreq(shape[0])
+            kx = 2 * np.pi * np.fft.rfftfreq(shape[1])
+            eigen = (2 * np.cos(ky)[:, None] + 2 * np.cos(kx)[None, :] - 4).astype(np.float32)
+            # На нулевой частоте значение 0; спектр в этой точке обнуляется после деления
+            eigen[0, 0] = 1.0
+            eigen = xp.asarray(eigen)
+            self._fft_k2_cache[key] = eigen
+        return eigen
 
     def scale_phase(self, phase_radians):
         return phase_radians * (self.lambda_angstrom / (2 * np.pi))
 
-    def threshold_unwrap(self, height_map, threshold=0.8, iterations=1, horizontal=True, vertical=True):
-        """Векторизированная версия пороговой развёртки."""
+    def threshold_unwrap(self, height_map, threshold=0.8, iterations=1, horizontal=True, vertical=True, copy=True):
+        """
+        Векторизированная версия пороговой развёртки.
+        При copy=False height_map изменяется на месте (если вызывающему код исходные данные не нужны).
+        """
         if height_map is None:
             return None
         
-        h = height_map.copy()
+        h = height_map.copy() if copy else height_map
         lam = self.lambda_angstrom
         limit = 0.5 * lam * threshold
         correction_step = 0.5 * lam
 
-        # Предварительно создаем массивы для индексов, если нужно, но здесь используем срезы
+        if HAS_NUMBA:
+            # Скомпилированное ядро: один проход по памяти без временных массивов
+            threshold_unwrap_kernel(h, limit, correction_step, max(1, iterations), horizontal, vertical)
+            return h
+
         for _ in range(max(1, iterations)):
             if horizontal:
-                # Вычисляем разницу между соседними пикселями по горизонтали
-                diff = np.diff(h, axis=1)
-                
-                # Создаем маску коррекций
-                corrections = np.zeros_like(diff)
-                corrections[diff > limit] = -correction_step
-                corrections[diff < -limit] = correction_step
-                
-                # Накапливаем коррекции слева направо
-                total_corrections = np.cumsum(corrections, axis=1)
-                
-                # Применяем к изображению (начиная со второго столбца)
-                h[:, 1:] += total_corrections
-
+                # Горизонтальный проход: коррекции накапливаются слева направо
+                self._threshold_pass(h, 1, limit, correction_step)
             if vertical:
-                # Вычисляем разницу между соседними пикселями по вертикали
-                diff = np.diff(h, axis=0)
-                
-                # Создаем маску коррекций
-                corrections = np.zeros_like(diff)
-                corrections[diff > limit] = -correction_step
-                corrections[diff < -limit] = correction_step
-                
-                # Накапливаем коррекции сверху вниз
-                total_corrections = np.cumsum(corrections, axis=0)
-                
-                # Применяем к изображению (начиная со второй строки)
-                h[1:, :] += total_corrections
+                # Вертикальный проход: коррекции накапливаются сверху вниз
+                self._threshold_pass(h, 0, limit, correction_step)
                 
         return h
 
+    def _unwrap_tile(self, tile, threshold, horizontal, vertical):
+        """Пороговая развёртка одного тайла на месте, безопасная для вызова из нескольких потоков."""
+        if HAS_NUMBA:
+            # Параллельное ядро нельзя запускать из нескольких потоков одновременно
+            # (слой потоков workqueue), поэтому для тайлов используется последовательное ядро без GIL
+            lam = self.lambda_angstrom
+            threshold_unwrap_tile_kernel(tile, 0.5 * lam * threshold, 0.5 * lam, 1, horizontal, vertical)
+        else:
+            self.threshold_unwrap(tile, threshold=threshold, iterations=1, horizontal=horizontal, vertical=vertical, copy=False)
+
+    def _scratch(self, name, shape, dtype):
+        """Рабочий буфер текущего потока: переиспользуется между вызовами и растет при необходимости."""
+        buffers = self._scratch_buffers.__dict__
+        size = shape[0] * shape[1]
+        buf = buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.size < size:
+            buf = np.empty(size, dtype=dtype)
+            buffers[name] = buf
+        return buf[:size].reshape(shape)
+
+    def _threshold_pass(self, h, axis, limit, step):
+        """Один проход NumPy-версии пороговой развёртки вдоль оси axis, на месте и без новых массивов."""
+        if axis == 1:
+            cur, prev = h[:, 1:], h[:, :-1]
+        else:
+            cur, prev = h[1:, :], h[:-1, :]
+        shape = cur.shape
+        
+        # Разница между соседними пикселями
+        diff = np.subtract(cur, prev, out=self._scratch('diff', shape, h.dtype))
+        
+        # Коррекции в полупериодах (целые числа): накопление без ошибки округления float
+        jump_up = np.greater(diff, limit, out=self._scratch('jump_up', shape, np.bool_))
+        jump_down = np.less(diff, -limit, out=self._scratch('jump_down', shape, np.bool_))
+        corrections = np.subtract(jump_down.view(np.int8), jump_up.view(np.int8),
+                                  out=self._scratch('corrections', shape, np.int8))
+        total_corrections = np.cumsum(corrections, axis=axis, dtype=np.int32,
+                                      out=self._scratch('total', shape, np.int32))
+        
+        # Переводим полупериоды в Å один раз (в буфер diff, он больше не нужен) и применяем к изображению
+        cur += np.multiply(total_corrections, step, out=diff)
+
     def phase_jump(self, tile, threshold=0.8):
         """Векторизированная проверка скачков фазы."""
         lam = self.lambda_angstrom
         limit = 0.5 * lam * threshold
+
+        if HAS_NUMBA:
+            # Выход на первом найденном скачке; вертикальные разности по строкам, а не по столбцам
+            return bool(phase_jump_kernel(tile, limit))
         
-        # Проверка по X и по Y сразу для всего тайла
-        diff_x = np.diff(tile, axis=1)
-        diff_y = np.diff(tile, axis=0)
-        
-        # Если хотя бы одна разница превышает предел
-        if np.any(np.abs(diff_x) > limit) or np.any(np.abs(diff_y) > limit):
+        # Сначала по X: если скачок найден, разности по Y не вычисляются.
+        # Модуль берется на месте, а сравнение с пределом - одно для максимума, без булевых массивов
+        diff_x = np.subtract(tile[:, 1:], tile[:, :-1])
+        if np.abs(diff_x, out=diff_x).max(initial=0) > limit:
             return True
-            
-        return False
+        
+        diff_y = np.subtract(tile[1:, :], tile[:-1, :])
+        return bool(np.abs(diff_y, out=diff_y).max(initial=0) > limit)
 
     def special_unwrap(self, p, tiles_mask, delimeter, threshold=0.8):
         """Векторизированная версия специальной развёртки с учетом маски плиток."""
@@ -107,33 +289,34 @@ class PhaseProcessor:
         
         rows, cols = p.shape
         
-        # Создаем полную маску пикселей из маски тайлов
-        # tiles_mask имеет размер (cols//del, rows//del)
-        # Нам нужно растянуть её до (rows, cols)
-        
-        # ВАЖНО: tiles_mask индексируется как [x_block, y_block], то есть [col, row]
-        # Нам нужно транспонировать её для repeat, чтобы получить (rows, cols) или правильно размножить
-        
-        # 1. Размножаем по оси X (столбцы)
-        mask_expanded_x = np.repeat(tiles_mask, delimeter, axis=0) # (w, h//del)
-        # 2. Размножаем по оси Y (строки)
-        mask_expanded = np.repeat(mask_expanded_x, delimeter, axis=1) # (w, h)
-        
-        # Обрезаем или дополняем до точного размера изображения (если размер не кратен делителю)
-        mask_full = np.zeros((cols, rows), dtype=bool)
-        w_end = min(cols, mask_expanded.shape[0])
-        h_end = min(rows, mask_expanded.shape[1])
-        mask_full[:w_end, :h_end] = mask_expanded[:w_end, :h_end]
-        
-        # Транспонируем, чтобы получить (rows, cols) как у изображения p
-        mask_full = mask_full.T 
+        # tiles_mask имеет размер (rows//del, cols//del) и индексируется [Y_idx, X_idx],
+        # то есть в том же C-порядке, что и изображение p.
+        # Номер тайла для каждой строки и столбца считается один раз (вместо деления на каждый пиксель);
+        # -1 - пиксели за последним полным тайлом (размер не кратен делителю), они считаются "хорошими"
+        ny, nx = tiles_mask.shape
+        row_tile = np.arange(rows, dtype=np.int32) // delimeter
+        col_tile = np.arange(cols, dtype=np.int32) // delimeter
+        row_tile[row_tile >= ny] = -1
+        col_tile[col_tile >= nx] = -1
+
+        if HAS_NUMBA:
+            # Все 3 итерации в одном скомпилированном ядре
+            special_unwrap_kernel(p, np.ascontiguousarray(tiles_mask), row_tile, col_tile, limit, correction_step, 3)
+            return p
+
+        row_valid = row_tile >= 0
+        col_valid = col_tile >= 0
+        # "Хорошие" пиксели - вне плохих тайлов; маска собирается один раз и используется во всех итерациях
+        valid = ~(tiles_mask[np.maximum(row_tile, 0)[:, np.newaxis], np.maximum(col_tile, 0)[np.newaxis, :]]
+                  & row_valid[:, np.newaxis] & col_valid[np.newaxis, :])
 
         for _ in range(3):
+            converged = True
             # --- Horizontal pass ---
             diff = np.diff(p, axis=1)
             # Маска для diff должна соответствовать целевому пикселю (x), от которого мы смотрим назад (x-1)
             # Если пиксель в "плохом" тайле (mask=True), мы НЕ применяем коррекцию (как в оригинале j-lastJ check skipped)
-            valid_mask = ~mask_full[:, 1:]
+            valid_mask = valid[:, 1:]
             
             corrections = np.zeros_like(diff)
             # Коррекция применяется только там, где valid_mask is True
@@ -144,11 +327,13 @@ class PhaseProcessor:
             corrections[jump_up & valid_mask] = -correction_step
             corrections[jump_down & valid_mask] = correction_step
             
-            p[:, 1:] += np.cumsum(corrections, axis=1)
+            if corrections.any():
+                converged = False
+                p[:, 1:] += np.cumsum(corrections, axis=1)
             
             # --- Vertical pass ---
             diff = np.diff(p, axis=0)
-            valid_mask = ~mask_full[1:, :]
+            valid_mask = valid[1:, :]
             
             corrections = np.zeros_like(diff)
             jump_up = (diff > limit)
@@ -157,7 +342,13 @@ class PhaseProcessor:
             corrections[jump_up & valid_mask] = -correction_step
             corrections[jump_down & valid_mask] = correction_step
             
-            p[1:, :] += np.cumsum(corrections, axis=0)
+            if corrections.any():
+                converged = False
+                p[1:, :] += np.cumsum(corrections, axis=0)
+            
+            # Без скачков за итерацию данные больше не изменятся: остальные итерации не нужны
+            if converged:
+                break
             
         return p
 
@@ -169,29 +360,39 @@ class PhaseProcessor:
         # Вычисляем размеры сетки тайлов
         nx = max(1, w // delimeter)
         ny = max(1, h // delimeter)
-        tiles_mask = np.zeros((nx, ny), dtype=bool)
+        # Маска в C-порядке изображения: [Y_idx, X_idx]
+        tiles_mask = np.zeros((ny, nx), dtype=bool)
         
-        # Этот цикл сложно полностью векторизовать, так как tiles_mask зависит от результата threshold_unwrap для каждого тайла.
-        # Но сам threshold_unwrap теперь быстрый, так что цикл по тайлам (которых немного) не будет узким местом.
-        for Y_idx in range(ny):
-            for X_idx in range(nx):
-                Y = Y_idx * delimeter
-                X = X_idx * delimeter
-                
-                # Обработка краев изображения, если размер не кратен delimeter
-                Y_end = min(Y + delimeter, h)
-                X_end = min(X + delimeter, w)
-                
-                tile = img[Y:Y_end, X:X_end]
-                
-                # Вызываем быструю версию
-                unwrapped_tile = self.threshold_unwrap(tile, threshold=threshold, iterations=1, horizontal=horizontal, vertical=vertical)
-                
-                # Проверка скачков
-                has_jump = self.phase_jump(unwrapped_tile, threshold=threshold)
-                tiles_mask[X_idx, Y_idx] = has_jump
-                
-                b[Y:Y_end, X:X_end] = unwrapped_tile
+        def process_tile(idx):
+            X_idx, Y_idx = idx
+            Y = Y_idx * delimeter
+            X = X_idx * delimeter
+            
+            # Обработка краев изображения, если размер не кратен delimeter
+            Y_end = min(Y + delimeter, h)
+            X_end = min(X + delimeter, w)
+            
+            # Копируем тайл сразу на его место в b и разворачиваем там же, без промежуточной копии.
+            # Тайлы не пересекаются, поэтому потоки пишут в b без блокировок
+            tile = b[Y:Y_end, X:X_end]
+            tile[...] = img[Y:Y_end, X:X_end]
+            self._unwrap_tile(tile, threshold, horizontal, vertical)
+            
+            # Проверка скачков
+            has_jump = self.phase_jump(tile, threshold=threshold)
+            tiles_mask[Y_idx, X_idx] = has_jump
+        
+        # Тайлы независимы: обрабатываем их параллельно (NumPy и ядро Numba отпускают GIL).
+        # Тайлы обходятся по кривой Мортона: соседние по обеим осям тайлы обрабатываются подряд и остаются в кэше
+        order = _morton_order(nx, ny)
+        if config.PHASE_TILE_WORKERS > 1 and len(order) > 1:
+            # Разбиваем обход на непрерывные куски, чтобы не платить за отдельную задачу на каждый тайл
+            chunk = -(-len(order) // config.PHASE_TILE_WORKERS)
+            chunks = [order[i:i + chunk] for i in range(0, len(order), chunk)]
+            list(self._get_tile_executor().map(lambda part: [process_tile(idx) for idx in part], chunks))
+        else:
+            for idx in order:
+                process_tile(idx)
                 
         if use_special:
             b = self.special_unwrap(b, tiles_mask, delimeter, threshold=threshold)
@@ -206,22 +407,20 @@ class PhaseProcessor:
         if phase_data is None or phase_data.size == 0:
             return phase_data
             
-        # Работаем с копией данных
-        result = phase_data.copy()
-        rows, cols = result.shape
+        rows, cols = phase_data.shape
 
         # 1. Горизонтальный тренд (расчет по первой строке)
         # В Java: horizontal[x] = k[x][0] -> linReg -> вычитание из всех строк
         x = np.arange(cols)
-        first_row = result[0, :] # Берем профиль первой строки
+        first_row = phase_data[0, :] # Берем профиль первой строки
         
         # Аппроксимируем прямой линией (степень 1)
         coeffs_h = np.polyfit(x, first_row, 1) 
         trend_h = np.polyval(coeffs_h, x)
         
-        # Вычитаем полученный тренд из всех строк изображения
+        # Вычитаем полученный тренд из всех строк изображения сразу в новый массив (без отдельной копии)
         # Использование broadcasting [None, :] применяет вектор (cols,) ко всей матрице (rows, cols)
-        result -= trend_h[np.newaxis, :]
+        result = np.subtract(phase_data, trend_h[np.newaxis, :], dtype=phase_data.dtype)
         
         # 2. Вертикальный тренд (расчет по первому столбцу)
         # В Java: vertical[y] = k[0][y] -> linReg -> вычитание из всех столбцов
@@ -245,18 +444,17 @@ class PhaseProcessor:
             return phase_data
             
         height, width = phase_data.shape
-        result = phase_data.copy()
         
         # Извлекаем горизонтальный и вертикальный профили
-        horizontal_profile = result[0, :]  # Первая строка
-        vertical_profile = result[:, 0]    # Первый столбец
+        horizontal_profile = phase_data[0, :]  # Первая строка
+        vertical_profile = phase_data[:, 0]    # Первый столбец
         
         # Вычисляем полиномиальные тренды
         horizontal_trend = self._fit_polynomial_trend(horizontal_profile, width)
         vertical_trend = self._fit_polynomial_trend(vertical_profile, height)
         
-        # Удаляем горизонтальный тренд (векторизировано)
-        result -= horizontal_trend[np.newaxis, :]
+        # Удаляем горизонтальный тренд (векторизировано), результат сразу пишется в новый массив
+        result = np.subtract(phase_data, horizontal_trend[np.newaxis, :], dtype=phase_data.dtype)
             
         # Удаляем вертикальный тренд (векторизировано)
         result -= vertical_trend[:, np.newaxis]
@@ -267,9 +465,9 @@ class PhaseProcessor:
         """
         Вычисляет полиномиальный тренд второго порядка для одномерного профиля
         """
-        # Создаем матрицу A для полинома второго порядка: y = w1 + w2*x + w3*x^2
-        x = np.arange(size)
-        # Используем встроенный polyfit, он быстрее и надежнее ручного обращения матриц
+        # Полином второго порядка y = w1 + w2*x + w3*x^2 без ручного построения матрицы A:
+        # polyfit решает задачу МНК через lstsq, быстрее и надежнее явного обращения A^T A
+        x = np.arange(size, dtype=np.float64)
         try:
             coeffs = np.polyfit(x, profile, 2) # Возвращает [a, b, c] для ax^2 + bx + c
             trend = np.polyval(coeffs, x)
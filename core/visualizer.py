@@ -3,52 +3,105 @@
 import numpy as np
 import cv2
 import os
+from functools import lru_cache
+from core.phase_kernels import HAS_NUMBA
+if HAS_NUMBA:
+    from core.phase_kernels import phase_to_gray_kernel
 
 def load_colormap(filepath):
-    """Загружает палитру из CSV файла."""
-    hex_colors = np.loadtxt(filepath, dtype=str)
+    """
+    Загружает палитру из CSV файла.
+    Результат кэшируется по пути и времени изменения файла (измененный файл перечитывается)
+    и возвращается только для чтения.
+    """
+    return _load_colormap(filepath, os.stat(filepath).st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _load_colormap(filepath, mtime_ns):
+    hex_colors = np.loadtxt(filepath, dtype=str, ndmin=1)
     # Конвертируем HEX в BGR (формат OpenCV)
     # Файл содержит цвета в формате AARRGGBB
     # Нам нужны каналы B, G, R (игнорируем Alpha)
     
+    # Строки numpy хранятся как UCS-4: представляем массив как таблицу кодов символов (N, ширина)
+    width = hex_colors.dtype.itemsize // 4
+    codes = hex_colors.view(np.uint32).reshape(len(hex_colors), width)
+    # ASCII -> значение шестнадцатеричной цифры ('0'-'9', 'a'-'f' и 'A'-'F')
+    nibbles = np.where(codes <= ord('9'), codes - ord('0'), (codes | 0x20) - ord('a') + 10)
+    # Пары цифр -> байты
+    channels = ((nibbles[:, 0::2] << 4) | nibbles[:, 1::2]).astype(np.uint8)
+    
     # Проверяем длину первой строки, чтобы определить формат
     if len(hex_colors) > 0 and len(hex_colors[0]) == 8:
-        # Format: AARRGGBB
-        # Alpha: h[0:2], Red: h[2:4], Green: h[4:6], Blue: h[6:8]
-        colormap = (
-            np.array([int(h[6:8], 16) for h in hex_colors]), # Blue
-            np.array([int(h[4:6], 16) for h in hex_colors]), # Green
-            np.array([int(h[2:4], 16) for h in hex_colors])  # Red
-        )
+        # Format: AARRGGBB -> байты A, R, G, B
+        colormap = channels[:, [3, 2, 1]]
     else:
         # Fallback for RRGGBB (length 6) or incorrect parsing
-        # Assuming RRGGBB: R: 0:2, G: 2:4, B: 4:6
-        colormap = (
-            np.array([int(h[4:6], 16) for h in hex_colors]), # Blue
-            np.array([int(h[2:4], 16) for h in hex_colors]), # Green
-            np.array([int(h[0:2], 16) for h in hex_colors])  # Red
-        )
+        # Assuming RRGGBB -> байты R, G, B
+        colormap = channels[:, [2, 1, 0]]
         
-    return np.stack(colormap, axis=1).astype(np.uint8)
+    colormap = np.ascontiguousarray(colormap)
+    # Один и тот же массив отдается всем вызывающим: запрещаем запись
+    colormap.setflags(write=False)
+    return colormap
+
+
+@lru_cache(maxsize=4)
+def _blank_image(shape):
+    """
+    Черный кадр заданной формы для постоянных фазовых данных (например, закрытая камера).
+    Кэшируется по форме и возвращается только для чтения: без выделения и обнуления памяти на каждый кадр.
+    """
+    image = np.zeros(shape, dtype=np.uint8)
+    image.setflags(write=False)
+    return image
 
 
-def create_phase_image(phase_data, colormap, inverse=False):
+def create_phase_image(phase_data, colormap, inverse=False, scratch=None, index_scratch=None):
+    """
+    Раскрашивает фазовые данные палитрой colormap.
+    scratch - необязательный uint16-буфер формы phase_data для индексов палитры,
+    index_scratch - необязательный np.intp-буфер той же формы для выборки из палитры;
+    их можно переиспользовать между кадрами, чтобы не выделять память на каждый кадр.
+    """
     min_val, max_val = np.min(phase_data), np.max(phase_data)
     if max_val == min_val:
-        return np.zeros((*phase_data.shape, 3), dtype=np.uint8)
+        return _blank_image((*phase_data.shape, 3))
     if inverse:
         min_val, max_val = max_val, min_val
-    indices = (phase_data - min_val) / (max_val - min_val) * (len(colormap) - 1)
-    indices = np.round(indices).astype(int)
-    color_image = colormap[indices]
+    if scratch is None or scratch.shape != phase_data.shape or scratch.dtype != np.uint16:
+        scratch = np.empty(phase_data.shape, dtype=np.uint16)
+    if index_scratch is None or index_scratch.shape != phase_data.shape or index_scratch.dtype != np.intp:
+        index_scratch = np.empty(phase_data.shape, dtype=np.intp)
+    last = len(colormap) - 1
+    # Нормировка, масштаб, округление и насыщение снизу нулем - один SIMD-проход OpenCV
+    # прямо в uint16-индексы (cv2.LUT и convertScaleAbs ограничены 256 значениями, а в палитре их больше)
+    scale = last / (max_val - min_val)
+    cv2.addWeighted(phase_data, scale, phase_data, 0, -min_val * scale, dst=scratch, dtype=cv2.CV_16U)
+    # Защита от выхода за палитру из-за округления
+    cv2.min(scratch, last, dst=scratch)
+    # Палитра упаковывается в uint32 (B, G, R, 0): выборка по индексу берет один 4-байтный элемент
+    # вместо строки из 3 байт, а лишний канал отбрасывается одним проходом cvtColor
+    palette = np.zeros((len(colormap), 4), dtype=np.uint8)
+    palette[:, :3] = colormap
+    # take приводит индексы к np.intp; расширение в готовый буфер избавляет от временного массива
+    np.copyto(index_scratch, scratch)
+    bgra = palette.view(np.uint32).ravel().take(index_scratch)
+    color_image = cv2.cvtColor(bgra.view(np.uint8).reshape(*phase_data.shape, 4), cv2.COLOR_BGRA2BGR)
     return color_image
 
 def create_phase_image_gray(phase_data, inverse=False):
     min_val, max_val = np.min(phase_data), np.max(phase_data)
     if max_val == min_val:
-        return np.zeros(phase_data.shape, dtype=np.uint8)
+        return _blank_image(phase_data.shape)
     if inverse:
         min_val, max_val = max_val, min_val
+    if HAS_NUMBA:
+        # Вычитание, масштаб, ограничение и приведение к uint8 - один проход по кадру
+        img = np.empty(phase_data.shape, dtype=np.uint8)
+        phase_to_gray_kernel(phase_data, min_val, max_val - min_val, img)
+        return img
     img = (phase_data - min_val) / (max_val - min_val)
     img = (img * 255.0).clip(0, 255).astype(np.uint8)
     return img
@@ -59,29 +112,37 @@ def create_interferogram(images, method='average'):
     Создает интерферограмму из набора изображений
     
     Args:
-        images: список numpy arrays с изображениями
+        images: список numpy arrays с изображениями или массив (N, H, W)
         method: метод создания ('average', 'first', 'last')
         
     Returns:
         numpy array с интерферограммой
     """
-    if not images or len(images) == 0:
+    if images is None or len(images) == 0:
         return None
         
-    if method == 'average':
-        # Усредняем все изображения
-        interferogram = np.mean(images, axis=0)
-    elif method == 'first':
+    if method == 'first':
         # Используем первое изображение
         interferogram = images[0]
     elif method == 'last':
         # Используем последнее изображение
         interferogram = images[-1]
+    elif np.asarray(images[0]).dtype == np.uint8 and len(images) <= 257:
+        # Усредняем все изображения ('average' и метод по умолчанию).
+        # Для uint8-кадров сумма до 257 кадров помещается в uint16: только целочисленные операции,
+        # целочисленное деление совпадает с отбрасыванием дробной части среднего
+        interferogram = np.zeros(np.shape(images[0]), dtype=np.uint16)
+        for image in images:
+            np.add(interferogram, image, out=interferogram)
+        interferogram //= len(images)
     else:
-        # По умолчанию - усреднение
-        interferogram = np.mean(images, axis=0)
+        # Накопление по одному кадру во float32: без стека N×H×W и без float64
+        interferogram = np.zeros(np.shape(images[0]), dtype=np.float32)
+        for image in images:
+            np.add(interferogram, image, out=interferogram)
+        interferogram /= len(images)
     
-    return interferogram.astype(np.uint8)
+    return interferogram.astype(np.uint8, copy=False)
 
 def save_data_to_csv(data, filepath):
     """
@@ -104,9 +165,8 @@ def save_data_to_csv(data, filepath):
             writer.writerow([f"# Dimensions: {data.shape[1]}x{data.shape[0]}"])
             writer.writerow([])  # Пустая строка
             
-            # Записываем данные
-            for row in data:
-                writer.writerow(row.tolist())
+            # Записываем данные одним вызовом: без построчного цикла в Python
+            writer.writerows(np.asarray(data).tolist())
                 
         return True
         
@@ -114,12 +174,26 @@ def save_data_to_csv(data, filepath):
         print(f"Ошибка сохранения CSV: {e}")
         return False
 
+def format_csv(data, fmt='%.6f', delimiter=','):
+    """
+    Форматирует 2D массив в байты CSV за один проход.
+    Результат совпадает с np.savetxt, но без построчного цикла и множества мелких write().
+    """
+    data = np.asarray(data)
+    rows, cols = data.shape
+    row_fmt = delimiter.join([fmt] * cols) + '\n'
+    return ((row_fmt * rows) % tuple(data.ravel().tolist())).encode('ascii')
+
 def save_image_as_csv(image, save_path):
     """Сохранить изображение в CSV формате"""
     try:
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        data_int = np.rint(image).astype(np.int64)
-        np.savetxt(save_path, data_int, fmt='%d', delimiter=',')
+        # Округление сразу в целочисленный буфер: без промежуточного float-массива
+        data_int = np.empty(np.shape(image), dtype=np.int32)
+        np.rint(image, out=data_int, casting='unsafe')
+        # Весь файл форматируется одной операцией и записывается одним write()
+        with open(save_path, 'wb') as f:
+            f.write(format_csv(data_int, fmt='%d', delimiter=','))
         if os.path.exists(save_path):
             print(f"Изображение сохранено в CSV формате: {save_path}")
             return True, save_path
@@ -1,22 +1,41 @@
 # MII4_60_Python/gui/main_window.py
 
-import cv2
 import numpy as np
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                                QPushButton, QLabel, QComboBox, QSlider, QCheckBox,
                                QMessageBox, QFileDialog, QGroupBox, QLineEdit, QSpinBox,
                                QGraphicsView, QGraphicsScene, QGraphicsPixmapItem,
                                QSizePolicy, QFrame, QScrollArea, QDialog)
-from PySide6.QtGui import QPixmap, QImage, QIntValidator, QDoubleValidator, QFont
+from PySide6.QtGui import QPixmap, QImage, QIntValidator, QDoubleValidator, QFont, QPainter, QOpenGLContext
 from PySide6.QtCore import Qt, QThread, Signal, Slot, QTimer
 
-from hardware.controller import CameraController, ArduinoController
-from core.phase_processor import PhaseProcessor
+from hardware.controller import CameraController, ArduinoController, CameraGrabThread
+from core.phase_processor import PhaseProcessor, HAS_CUPY
 from core.visualizer import load_colormap, create_phase_image_gray, create_phase_image
 from core.dpi_recorder import DPIRecorder
 from core.visualizer import create_interferogram, save_image_as_csv
 import config
+try:
+    from PySide6.QtOpenGLWidgets import QOpenGLWidget
+    _HAS_OPENGL = True
+except ImportError:
+    _HAS_OPENGL = False
 import time
+import json
+import queue
+import threading
+
+def _to_qimage(frame):
+    """
+    Оборачивает uint8-кадр в QImage без копирования: (H, W) - Format_Grayscale8,
+    (H, W, 3) в порядке BGR - Format_BGR888. QImage ссылается на буфер массива,
+    поэтому массив должен жить, пока используется изображение.
+    """
+    height, width = frame.shape[:2]
+    if frame.ndim == 2:
+        return QImage(frame.data, width, height, frame.strides[0], QImage.Format_Grayscale8)
+    return QImage(frame.data, width, height, frame.strides[0], QImage.Format_BGR888)
+
 
 # Worker для постоянной трансляции видео с камеры
 class CameraStreamWorker(QThread):
@@ -32,16 +51,14 @@ class CameraStreamWorker(QThread):
         self.is_running = True
         while self.is_running:
             try:
-                if self.camera_controller.is_running:
-                    frame = self.camera_controller.get_frame()
-                    if frame is not None:
-                        # Конвертируем в цветное изображение для отображения
-                        if len(frame.shape) == 2:  # Если серое изображение
-                            frame_color = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
-                        else:
-                            frame_color = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        self.new_frame.emit(frame_color)
-                self.msleep(33)  # ~30 FPS
+                frame = self.camera_controller.get_frame() if self.camera_controller.is_running else None
+                if frame is not None:
+                    # Кадр передается как есть: серый отображается через QImage.Format_Grayscale8,
+                    # цветной BGR - через QImage.Format_BGR888, без конвертации в потоке.
+                    # Темп задает камера (get_frame ждет кадр), частоту перерисовки - таймер GUI
+                    self.new_frame.emit(frame)
+                else:
+                    self.msleep(33)
             except Exception as e:
                 self.error.emit(f"Ошибка захвата кадра: {str(e)}")
                 break
@@ -51,6 +68,15 @@ class CameraStreamWorker(QThread):
         self.wait()
 
 # Worker для выполнения захвата в отдельном потоке
+# Worker для поиска камер и COM-портов: перебор устройств занимает заметное время и не должен блокировать GUI
+class DeviceScanWorker(QThread):
+    devices_found = Signal(list, list)
+
+    def run(self):
+        cameras = CameraController.list_cameras()
+        ports = ArduinoController.list_ports()
+        self.devices_found.emit(cameras, ports)
+
 class MeasurementWorker(QThread):
     new_phase_image = Signal(np.ndarray)
     new_interferogram = Signal(np.ndarray)
@@ -65,83 +91,157 @@ class MeasurementWorker(QThread):
         self.arduino = arduino
         self.params = params
         self.is_running = True
+        # Будит поток захвата, ожидающий окончания задержки шага, при остановке измерения
+        self._stop_event = threading.Event()
         self.processor = PhaseProcessor(lambda_angstrom=params['lambda_angstrom'])
         self.colormap = load_colormap(config.COLORMAP_FILE)
+        # Буферы индексов палитры для create_phase_image, переиспользуются между кадрами
+        self._phase_scratch = None
+        self._phase_index_scratch = None
 
     def run(self):
         try:
             series_count = int(self.params.get('series_count', 64))
-            for _ in range(series_count):
-                if not self.is_running:
-                    break
-                images = []
-                for i in range(self.params['steps']):
-                    if not self.is_running:
+            # Захват и обработка идут параллельно: пока обрабатывается одна серия, отдельный поток
+            # снимает следующую. Два буфера кадров по очереди переходят от потока захвата к обработке и обратно
+            free_stacks = queue.Queue()
+            ready_stacks = queue.Queue()
+            for _ in range(2):
+                free_stacks.put(np.empty(0, dtype=np.float32))
+            capture_thread = threading.Thread(target=self._capture_loop,
+                                              args=(series_count, free_stacks, ready_stacks),
+                                              name="measurement-capture", daemon=True)
+            capture_thread.start()
+            try:
+                while True:
+                    images = ready_stacks.get()
+                    if images is None:
                         break
-                    if self.arduino and self.arduino.is_connected:
-                        self.arduino.send_step_command(i)
-                    time.sleep(self.params['delay'] / 1000.0)
-                    
-                    # Цикл повторных попыток получения кадра
-                    frame = None
-                    for retry in range(5):
-                        frame = self.camera.get_frame()
-                        if frame is not None:
-                            break
-                        time.sleep(0.01)
-
-                    if frame is None:
-                        raise Exception("Не удалось получить кадр с камеры (timeout).")
-                    images.append(frame)
-                    self.new_step_image.emit(frame)
-
-                if len(images) == self.params['steps']:
-                    phase_wrapped = self.processor.compute_phase(images, self.params['steps'])
-                    use_scale = self.params.get('scale', True)
-                    threshold = self.params.get('threshold', 0.8)
-                    if self.params.get('unwrap', False):
-                        if use_scale:
-                            height_map = self.processor.scale_phase(phase_wrapped)
-                            if self.params.get('tile_unwrap', False):
-                                height_map = self.processor.tile_unwrap(height_map, delimeter=self.params.get('tile_size', 32), threshold=threshold, horizontal=True, vertical=True, use_special=True)
-                            else:
-                                height_map = self.processor.threshold_unwrap(height_map, threshold=threshold, iterations=2, horizontal=True, vertical=True)
-                            phase_data = height_map
-                        else:
-                            unwrapped = self.processor.unwrap_phase(phase_wrapped)
-                            phase_data = unwrapped
-                    else:
-                        phase_data = self.processor.scale_phase(phase_wrapped) if use_scale else phase_wrapped
-                    if self.params.get('remove_trend', False):
-                        phase_data = self.processor.remove_linear_trend(phase_data)
-                    if self.params.get('rainbow', False):
-                        phase_image = create_phase_image(
-                            phase_data,
-                            self.colormap,
-                            inverse=self.params.get('inverse', False)
-                        )
-                    else:
-                        phase_image = create_phase_image_gray(
-                            phase_data,
-                            inverse=self.params.get('inverse', False)
-                        )
-                    self.phase_data_ready.emit(phase_data)
-                    self.new_phase_image.emit(phase_image)
-
-                    interferogram = create_interferogram(images, 'average')
-                    if interferogram is not None:
-                        if len(interferogram.shape) == 2:
-                            interferogram = cv2.cvtColor(interferogram, cv2.COLOR_GRAY2RGB)
-                        else:
-                            interferogram = cv2.cvtColor(interferogram, cv2.COLOR_BGR2RGB)
-                        self.new_interferogram.emit(interferogram)
+                    if isinstance(images, Exception):
+                        raise images
+                    self._process_series(images)
+                    free_stacks.put(images)
+            finally:
+                # При ошибке обработки останавливаем захват и будим поток, если он ждет свободный буфер
+                self.stop()
+                free_stacks.put(None)
+                capture_thread.join()
             
             # self.finished.emit() <-- УДАЛЕНО: QThread сам отправит finished при выходе из run()
         except Exception as e:
             self.error.emit(str(e))
 
+    def _capture_loop(self, series_count, free_stacks, ready_stacks):
+        """Поток захвата: снимает серии в свободные буферы и передает их на обработку."""
+        grabber = CameraGrabThread(self.camera)
+        grabber.start()
+        try:
+            for _ in range(series_count):
+                if not self.is_running:
+                    break
+                stack = free_stacks.get()
+                if stack is None:
+                    break
+                stack = self._capture_series(stack, grabber)
+                if stack is None:
+                    break
+                ready_stacks.put(stack)
+        except Exception as e:
+            ready_stacks.put(e)
+        finally:
+            grabber.stop()
+            ready_stacks.put(None)
+
+    def _capture_series(self, stack, grabber):
+        """
+        Снимает одну серию из steps кадров в float32-массив stack (steps, H, W), при необходимости
+        выделяя его заново под размер кадра. Кадры берутся из потока grabber (CameraGrabThread).
+        Возвращает None, если измерение остановлено.
+        """
+        delay_ns = int(self.params['delay'] * 1_000_000)
+        for i in range(self.params['steps']):
+            if not self.is_running:
+                return None
+            # Задержка отсчитывается от момента перед отправкой команды: время обмена с Arduino
+            # входит в нее, а не добавляется к ней на каждом шаге
+            deadline = time.monotonic_ns() + delay_ns
+            acked = False
+            if self.arduino and self.arduino.is_connected:
+                # С подтверждением от прошивки задержка - лишь верхняя граница ожидания
+                ack_timeout = delay_ns / 1e9 if config.ARDUINO_STEP_ACK else None
+                acked = self.arduino.send_step_command(i, ack_timeout=ack_timeout)
+            remaining = deadline - time.monotonic_ns()
+            if not acked and remaining > 0 and self._stop_event.wait(remaining / 1e9):
+                # Измерение остановлено во время задержки: не дожидаемся ее конца
+                return None
+
+            # Кадр, экспонированный после задержки: ждем следующий после текущего счетчика
+            frame = grabber.wait_for_frame_after(grabber.frame_counter, config.CAMERA_FRAME_TIMEOUT)
+            if frame is None:
+                raise Exception("Не удалось получить кадр с камеры (timeout).")
+            # Стек хранится во float32: приведение типа выполняется здесь, при записи кадра в потоке
+            # захвата, и compute_phase получает готовый куб без копии
+            stack_shape = (self.params['steps'], *frame.shape)
+            if stack.shape != stack_shape:
+                stack = np.empty(stack_shape, dtype=np.float32)
+            stack[i] = frame
+            self.new_step_image.emit(frame)
+        return stack
+
+    def _process_series(self, images):
+        """Вычисляет фазу по серии кадров и отправляет изображения в GUI."""
+        phase_wrapped = self.processor.compute_phase(images, self.params['steps'])
+        use_scale = self.params.get('scale', True)
+        threshold = self.params.get('threshold', 0.8)
+        if self.params.get('unwrap', False) and self.params.get('gpu_unwrap', False):
+            # Развёртка на GPU работает с фазой в радианах, масштаб применяется к результату
+            unwrapped = self.processor.unwrap_phase_gpu(phase_wrapped)
+            phase_data = self.processor.scale_phase(unwrapped) if use_scale else unwrapped
+        elif self.params.get('unwrap', False):
+            if use_scale:
+                height_map = self.processor.scale_phase(phase_wrapped)
+                if self.params.get('tile_unwrap', False):
+                    height_map = self.processor.tile_unwrap(height_map, delimeter=self.params.get('tile_size', 32), threshold=threshold, horizontal=True, vertical=True, use_special=True)
+                else:
+                    height_map = self.processor.threshold_unwrap(height_map, threshold=threshold, iterations=2, horizontal=True, vertical=True)
+                phase_data = height_map
+            else:
+                unwrapped = self.processor.unwrap_phase(phase_wrapped)
+                phase_data = unwrapped
+        else:
+            phase_data = self.processor.scale_phase(phase_wrapped) if use_scale else phase_wrapped
+        if self.params.get('remove_trend', False):
+            phase_data = self.processor.remove_linear_trend(phase_data)
+        if self.params.get('polynomial_trend', False):
+            phase_data = self.processor.remove_polynomial_trend(phase_data)
+        if self.params.get('rainbow', False):
+            if self._phase_scratch is None or self._phase_scratch.shape != phase_data.shape:
+                self._phase_scratch = np.empty(phase_data.shape, dtype=np.uint16)
+                self._phase_index_scratch = np.empty(phase_data.shape, dtype=np.intp)
+            phase_image = create_phase_image(
+                phase_data,
+                self.colormap,
+                inverse=self.params.get('inverse', False),
+                scratch=self._phase_scratch,
+                index_scratch=self._phase_index_scratch
+            )
+        else:
+            phase_image = create_phase_image_gray(
+                phase_data,
+                inverse=self.params.get('inverse', False)
+            )
+        self.phase_data_ready.emit(phase_data)
+        self.new_phase_image.emit(phase_image)
+
+        interferogram = create_interferogram(images, 'average')
+        if interferogram is not None:
+            # Серая интерферограмма передается без расширения до 3 каналов, цветная - в BGR без конвертации
+            self.new_interferogram.emit(interferogram)
+
+
     def stop(self):
         self.is_running = False
+        self._stop_event.set()
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -157,7 +257,7 @@ class MainWindow(QMainWindow):
         self.dpi_recorder = DPIRecorder()
         self.dpi_recorder.recording_started.connect(self.on_dpi_recording_started)
         self.dpi_recorder.recording_stopped.connect(self.on_dpi_recording_stopped)
-        self.dpi_recorder.image_saved.connect(self.on_dpi_image_saved)
+        self.dpi_recorder.images_saved_batch.connect(self.on_dpi_images_saved)
         self.dpi_recorder.error_occurred.connect(self.on_error)
         
         # Список изображений для интерферограммы
@@ -171,9 +271,21 @@ class MainWindow(QMainWindow):
         self.camera_stream_worker = None
         self.main_view_mode = 'camera'
         
+        # Worker для поиска устройств
+        self.device_scan_worker = None
+        
+        # Кадры для отображения: потоки измерения и трансляции только сохраняют последний кадр каждого вида,
+        # а GUI перерисовывает их по таймеру не чаще config.GUI_DISPLAY_INTERVAL_MS
+        self._pending_display = {}
+        self._pending_display_lock = threading.Lock()
+        self._display_timer = QTimer(self)
+        self._display_timer.setInterval(config.GUI_DISPLAY_INTERVAL_MS)
+        self._display_timer.timeout.connect(self._flush_pending_display)
+        
         self._init_ui()
         self._populate_devices()
         self.last_phase_qimage = None
+        self.last_phase_array = None
 
     def _init_ui(self):
         central_widget = QWidget()
@@ -235,6 +347,12 @@ class MainWindow(QMainWindow):
         self.unwrap_checkbox = QCheckBox("Развертка фазы")
         self.controls_layout.addWidget(self.unwrap_checkbox)
         
+        self.gpu_unwrap_checkbox = QCheckBox("Развертка на GPU (CuPy)")
+        self.gpu_unwrap_checkbox.setEnabled(HAS_CUPY)
+        self.gpu_unwrap_checkbox.setToolTip("Развертка фазы методом наименьших квадратов через БПФ на видеокарте"
+                                            if HAS_CUPY else "Требуется CuPy и CUDA-совместимая видеокарта")
+        self.controls_layout.addWidget(self.gpu_unwrap_checkbox)
+        
         self.trend_checkbox = QCheckBox("Удаление тренда")
         self.controls_layout.addWidget(self.trend_checkbox)
         
@@ -282,7 +400,7 @@ class MainWindow(QMainWindow):
         right_layout.setSpacing(0)
         right_layout.setContentsMargins(0, 0, 0, 0)
 
-        self.interferogram_view = GraphicsImageView()
+        self.interferogram_view = GraphicsImageView(use_opengl=config.GUI_USE_OPENGL)
         self.interferogram_view.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.interferogram_view.setToolTip("Интерферограмма")
         interfer_box = QVBoxLayout()
@@ -390,16 +508,30 @@ class MainWindow(QMainWindow):
         self.controls_layout.addWidget(tile_group)
 
     def _populate_devices(self):
+        """Запускает поиск доступных устройств в фоне; списки заполняются по его завершении."""
+        if self.device_scan_worker is not None and self.device_scan_worker.isRunning():
+            return
+        self.camera_combo.clear()
+        self.camera_combo.setPlaceholderText("Поиск камер...")
+        self.port_combo.clear()
+        self.port_combo.setPlaceholderText("Поиск портов...")
+        self.device_scan_worker = DeviceScanWorker()
+        self.device_scan_worker.devices_found.connect(self.on_devices_found)
+        self.device_scan_worker.start()
+
+    @Slot(list, list)
+    def on_devices_found(self, cameras, ports):
         """Заполняет списки доступных устройств."""
-        # Заполняем список камер
-        cameras = self.camera_ctrl.list_cameras()
+        # Заполняем список камер. С текстом-заполнителем Qt не выбирает первый элемент сам:
+        # выбираем его явно, чтобы, как и раньше, сразу подключить первую камеру и порт
         self.camera_combo.clear()
         self.camera_combo.addItems(cameras)
+        self.camera_combo.setCurrentIndex(0)
         
         # Заполняем список портов Arduino
-        ports = self.arduino_ctrl.list_ports()
         self.port_combo.clear()
         self.port_combo.addItems(ports)
+        self.port_combo.setCurrentIndex(0)
 
     def _refresh_devices(self):
         """Обновляет список устройств, предварительно освобождая ресурсы Arduino."""
@@ -550,7 +682,9 @@ class MainWindow(QMainWindow):
             'lambda_angstrom': float(self.lambda_input.text()),
             'delay': self.delay_slider.value(),
             'unwrap': self.unwrap_checkbox.isChecked(),
+            'gpu_unwrap': self.gpu_unwrap_checkbox.isChecked(),
             'remove_trend': self.trend_checkbox.isChecked(),
+            'polynomial_trend': hasattr(self, 'polynomial_trend_checkbox') and self.polynomial_trend_checkbox.isChecked(),
             'inverse': self.inverse_checkbox.isChecked(),
             'rainbow': self.rainbow_checkbox.isChecked(),
             'threshold': self.threshold_slider.value() / 100.0,
@@ -561,13 +695,16 @@ class MainWindow(QMainWindow):
         }
         
         self.worker = MeasurementWorker(self.camera_ctrl, self.arduino_ctrl, params)
-        self.worker.new_phase_image.connect(self.update_phase_image)
+        # DirectConnection: слоты выполняются в потоке измерения и лишь подменяют ожидающий кадр,
+        # поэтому необработанные кадры не копятся в очереди событий GUI
+        self.worker.new_phase_image.connect(self._queue_phase_image, Qt.DirectConnection)
         self.worker.phase_data_ready.connect(self.on_phase_data_ready)
         self.worker.phase_data_ready.connect(self.dpi_recorder.save_phase_data)
-        self.worker.new_interferogram.connect(self.update_interferogram_image)
+        self.worker.new_interferogram.connect(self._queue_interferogram, Qt.DirectConnection)
         # Подключаемся к стандартному сигналу finished
         self.worker.finished.connect(self.on_measurement_finished)
         self.worker.error.connect(self.on_measurement_error)
+        self._display_timer.start()
         self.worker.start()
         
         self.start_button.setText("Остановить измерение")
@@ -578,32 +715,45 @@ class MainWindow(QMainWindow):
             self.worker.wait()
         self.start_button.setText("Начать измерение")
 
+    def _queue_phase_image(self, cv_img):
+        with self._pending_display_lock:
+            self._pending_display['phase'] = cv_img
+
+    def _queue_interferogram(self, frame):
+        with self._pending_display_lock:
+            self._pending_display['interferogram'] = frame
+
+    def _queue_camera_frame(self, frame):
+        with self._pending_display_lock:
+            self._pending_display['camera'] = frame
+
+    def _flush_pending_display(self):
+        """Отображает последние кадры измерения и трансляции, пришедшие после предыдущего срабатывания таймера."""
+        with self._pending_display_lock:
+            pending = self._pending_display
+            self._pending_display = {}
+        if 'phase' in pending:
+            self.update_phase_image(pending['phase'])
+        if 'interferogram' in pending:
+            self.update_interferogram_image(pending['interferogram'])
+        if 'camera' in pending:
+            self.update_camera_frame(pending['camera'])
+
     @Slot(np.ndarray)
     def update_phase_image(self, cv_img):
-        if hasattr(self, 'polynomial_trend_checkbox') and self.polynomial_trend_checkbox.isChecked():
-            pass
-        
         self.export_csv_button.setEnabled(True)
         
-        if len(cv_img.shape) == 2:
-            h, w = cv_img.shape
-            q_image = QImage(cv_img.data, w, h, w, QImage.Format_Grayscale8)
-        else:
-            h, w, c = cv_img.shape
-            q_image = QImage(cv_img.data, w, h, 3 * w, QImage.Format_RGB888).rgbSwapped()
+        # Qt читает BGR напрямую: без копии rgbSwapped() на каждый кадр
+        q_image = _to_qimage(cv_img)
+        # QImage ссылается на буфер numpy без копирования: храним массив, пока используется изображение
+        self.last_phase_array = cv_img
         self.last_phase_qimage = q_image
         if getattr(self, 'main_view_mode', 'camera') == 'phase':
             self.interferogram_view.set_image(q_image, preserve_transform=True)
 
     @Slot(np.ndarray)
     def update_interferogram_image(self, frame):
-        if len(frame.shape) == 2:
-            height, width = frame.shape
-            q_image = QImage(frame.data, width, height, width, QImage.Format_Grayscale8)
-        else:
-            height, width, channel = frame.shape
-            bytes_per_line = 3 * width
-            q_image = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888)
+        q_image = _to_qimage(frame)
         if getattr(self, 'main_view_mode', 'camera') == 'camera':
             self.interferogram_view.set_image(q_image, preserve_transform=True)
 
@@ -612,6 +762,9 @@ class MainWindow(QMainWindow):
         self.current_phase_data = phase_data
 
     def on_measurement_finished(self):
+        # Показываем последние кадры, не дожидаясь таймера
+        self._display_timer.stop()
+        self._flush_pending_display()
         self.start_button.setText("Начать измерение")
         if self.dpi_recorder.is_recording:
             self.dpi_recorder.mark_experiment_end()
@@ -630,25 +783,45 @@ class MainWindow(QMainWindow):
         )
         if filename:
             try:
-                settings = [
-                    str(self.camera_combo.currentIndex()),
-                    str(self.steps_combo.currentIndex()),
-                    str(self.lambda_input.text()),
-                    str(self.inverse_checkbox.isChecked()),
-                    str(self.rainbow_checkbox.isChecked()),
-                    str(self.trend_checkbox.isChecked()),
-                    str(self.delay_slider.value()),
-                    f"{self.threshold_slider.value() / 100.0}",
-                    str(self.unwrap_checkbox.isChecked()),
-                    self.port_combo.currentText()
-                ]
+                settings = {
+                    'camera': self.camera_combo.currentIndex(),
+                    'steps': self.steps_combo.currentIndex(),
+                    'lambda': self.lambda_input.text(),
+                    'inverse': self.inverse_checkbox.isChecked(),
+                    'rainbow': self.rainbow_checkbox.isChecked(),
+                    'trend': self.trend_checkbox.isChecked(),
+                    'delay': self.delay_slider.value(),
+                    'threshold': self.threshold_slider.value() / 100.0,
+                    'unwrap': self.unwrap_checkbox.isChecked(),
+                    'port': self.port_combo.currentText()
+                }
                 with open(filename, 'w', encoding='utf-8') as f:
-                    for s in settings:
-                        f.write(s + "\n")
+                    json.dump(settings, f, ensure_ascii=False, indent=2)
                 QMessageBox.information(self, "Успех", f"Настройки сохранены: {filename}")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить: {str(e)}")
 
+    # Порядок строк в старом текстовом формате настроек (по одному значению на строку)
+    _LEGACY_SETTINGS_KEYS = ('camera', 'steps', 'lambda', 'inverse', 'rainbow', 'trend',
+                             'delay', 'threshold', 'unwrap', 'port')
+
+    @classmethod
+    def _parse_legacy_settings(cls, text):
+        """Разбирает старый построчный формат настроек в словарь того же вида, что и JSON."""
+        lines = [line.strip() for line in text.splitlines() if line.strip() != ""]
+        settings = dict(zip(cls._LEGACY_SETTINGS_KEYS, lines))
+        for key in ('camera', 'steps'):
+            if key in settings:
+                settings[key] = int(settings[key])
+        for key in ('inverse', 'rainbow', 'trend', 'unwrap'):
+            if key in settings:
+                settings[key] = settings[key].lower() == 'true'
+        if 'delay' in settings:
+            settings['delay'] = int(float(settings['delay']))
+        if 'threshold' in settings:
+            settings['threshold'] = float(settings['threshold'])
+        return settings
+
     def load_settings(self):
         filename, _ = QFileDialog.getOpenFileName(
             self, "Загрузить настройки", "", "Текстовые файлы (*.txt)"
@@ -656,29 +829,34 @@ class MainWindow(QMainWindow):
         if filename:
             try:
                 with open(filename, 'r', encoding='utf-8') as f:
-                    lines = [line.strip() for line in f.readlines() if line.strip() != ""]
-                cam_idx = int(lines[0]) if len(lines) > 0 else 0
-                steps_idx = int(lines[1]) if len(lines) > 1 else 1
+                    text = f.read()
+                # Настройки хранятся в JSON; файлы старого построчного формата читаются как раньше
+                if text.lstrip().startswith('{'):
+                    settings = json.loads(text)
+                else:
+                    settings = self._parse_legacy_settings(text)
+                cam_idx = settings.get('camera', 0)
+                steps_idx = settings.get('steps', 1)
                 self.camera_combo.setCurrentIndex(min(cam_idx, self.camera_combo.count()-1))
                 self.steps_combo.setCurrentIndex(min(steps_idx, self.steps_combo.count()-1))
-                if len(lines) > 2:
-                    self.lambda_input.setText(lines[2])
-                if len(lines) > 3:
-                    self.inverse_checkbox.setChecked(lines[3].lower() == 'true')
-                if len(lines) > 4:
-                    self.rainbow_checkbox.setChecked(lines[4].lower() == 'true')
-                if len(lines) > 5:
-                    self.trend_checkbox.setChecked(lines[5].lower() == 'true')
-                if len(lines) > 6:
-                    self.delay_slider.setValue(int(float(lines[6])))
-                if len(lines) > 7:
-                    val = float(lines[7])
+                if 'lambda' in settings:
+                    self.lambda_input.setText(str(settings['lambda']))
+                if 'inverse' in settings:
+                    self.inverse_checkbox.setChecked(bool(settings['inverse']))
+                if 'rainbow' in settings:
+                    self.rainbow_checkbox.setChecked(bool(settings['rainbow']))
+                if 'trend' in settings:
+                    self.trend_checkbox.setChecked(bool(settings['trend']))
+                if 'delay' in settings:
+                    self.delay_slider.setValue(int(settings['delay']))
+                if 'threshold' in settings:
+                    val = float(settings['threshold'])
                     self.threshold_slider.setValue(int(val * 100))
                     self.threshold_label.setText(f"{val:.2f}")
-                if len(lines) > 8:
-                    self.unwrap_checkbox.setChecked(lines[8].lower() == 'true')
-                if len(lines) > 9:
-                    port_text = lines[9]
+                if 'unwrap' in settings:
+                    self.unwrap_checkbox.setChecked(bool(settings['unwrap']))
+                if 'port' in settings:
+                    port_text = settings['port']
                     idx = self.port_combo.findText(port_text)
                     if idx != -1:
                         self.port_combo.setCurrentIndex(idx)
@@ -708,19 +886,23 @@ class MainWindow(QMainWindow):
                     self.dpi_record_button.setText("Остановить DPI запись")
                     self.dpi_status_label.setText("DPI: Запись...")
         else:
+            # Кнопка и статус обновятся в on_dpi_recording_stopped после дозаписи очереди
             self.dpi_recorder.stop_recording()
-            self.dpi_record_button.setText("Начать DPI запись")
-            self.dpi_status_label.setText("DPI: Остановлена")
+            self.dpi_status_label.setText("DPI: Завершение записи...")
     
     def on_dpi_recording_started(self):
         self.dpi_record_button.setText("Остановить DPI запись")
         self.dpi_status_label.setText("DPI: Запись...")
     
-    def on_dpi_recording_stopped(self):
+    def on_dpi_recording_stopped(self, dropped_frames):
         self.dpi_record_button.setText("Начать DPI запись")
-        self.dpi_status_label.setText("DPI: Остановлена")
+        if dropped_frames:
+            self.dpi_status_label.setText(f"DPI: Остановлена (пропущено кадров: {dropped_frames})")
+        else:
+            self.dpi_status_label.setText("DPI: Остановлена")
     
-    def on_dpi_image_saved(self, image_number, filepath):
+    def on_dpi_images_saved(self, saved):
+        image_number, _ = saved[-1]
         self.dpi_status_label.setText(f"DPI: Сохранено {image_number} изображений")
     
     def on_error(self, error_msg):
@@ -746,6 +928,9 @@ class MainWindow(QMainWindow):
                 QMessageBox.critical(self, "Ошибка", result)
 
     def closeEvent(self, event):
+        if self.device_scan_worker and self.device_scan_worker.isRunning():
+            self.device_scan_worker.wait()
+        
         if self.worker and self.worker.isRunning():
             self.worker.stop()
             self.worker.wait()
@@ -754,7 +939,7 @@ class MainWindow(QMainWindow):
             self.camera_stream_worker.stop()
             
         if self.dpi_recorder.is_recording:
-            self.dpi_recorder.stop_recording()
+            self.dpi_recorder.stop_recording(wait=True)
             
         self.camera_ctrl.stop()
         self.arduino_ctrl.disconnect()
@@ -778,8 +963,10 @@ class MainWindow(QMainWindow):
 
         try:
             self.camera_stream_worker = CameraStreamWorker(self.camera_ctrl)
-            self.camera_stream_worker.new_frame.connect(self.update_camera_frame)
+            # Как и для кадров измерения: сохраняется только последний кадр, GUI рисует его по таймеру
+            self.camera_stream_worker.new_frame.connect(self._queue_camera_frame, Qt.DirectConnection)
             self.camera_stream_worker.error.connect(self.on_camera_stream_error)
+            self._display_timer.start()
             self.camera_stream_worker.start()
             
             self.stream_button.setText("Остановить трансляцию")
@@ -791,15 +978,16 @@ class MainWindow(QMainWindow):
     def stop_camera_stream(self):
         if self.camera_stream_worker and self.camera_stream_worker.isRunning():
             self.camera_stream_worker.stop()
+            self._display_timer.stop()
+            with self._pending_display_lock:
+                self._pending_display.pop('camera', None)
             self.stream_button.setText("Включить трансляцию")
             print("Трансляция камеры остановлена")
     
     @Slot(np.ndarray)
     def update_camera_frame(self, frame):
         try:
-            height, width, channel = frame.shape
-            bytes_per_line = 3 * width
-            q_image = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888)
+            q_image = _to_qimage(frame)
             if getattr(self, 'main_view_mode', 'camera') == 'camera':
                 self.interferogram_view.set_image(q_image, preserve_transform=True)
             
@@ -824,8 +1012,15 @@ class MainWindow(QMainWindow):
         self.stop_camera_stream()
 
 class GraphicsImageView(QGraphicsView):
-    def __init__(self):
+    def __init__(self, use_opengl=False):
         super().__init__()
+        # Контекст OpenGL может быть недоступен (удаленный рабочий стол, виртуальная машина) -
+        # тогда остается обычная отрисовка на CPU
+        if use_opengl and _HAS_OPENGL and QOpenGLContext().create():
+            # Вьюпорт OpenGL: кадр загружается текстурой, масштабирование и сглаживание делает GPU
+            self.setViewport(QOpenGLWidget())
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+            self.setRenderHint(QPainter.SmoothPixmapTransform)
         self._scene = QGraphicsScene(self)
         self.setScene(self._scene)
         self._pix_item = QGraphicsPixmapItem()
@@ -841,9 +1036,11 @@ class GraphicsImageView(QGraphicsView):
 
     def set_image(self, qimage: QImage, preserve_transform: bool = False):
         pixmap = QPixmap.fromImage(qimage)
-        is_first = self._pix_item.pixmap().isNull()
+        same_size = self._pix_item.pixmap().size() == pixmap.size()
         self._pix_item.setPixmap(pixmap)
-        if preserve_transform and self._zoom != 0:
+        if preserve_transform and (self._zoom != 0 or same_size):
+            # Масштаб выполняется преобразованием вида при отрисовке; для кадра того же размера
+            # подгонка уже выполнена (и обновляется в resizeEvent), пересчитывать её на каждый кадр не нужно
             return
         self.fitInView(self._pix_item, Qt.KeepAspectRatio)
         if not preserve_transform:
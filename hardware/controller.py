@@ -2,6 +2,7 @@ import cv2
 import serial
 import serial.tools.list_ports
 import time
+import threading
 import config
 import inspect
 from collections import namedtuple
@@ -83,6 +84,53 @@ class CameraController:
             return (width, height)
         return None
 
+class CameraGrabThread(threading.Thread):
+    """
+    Фоновый поток, непрерывно читающий кадры камеры. Хранит только последний кадр и
+    счетчик кадров: измерение берет кадр, снятый после нужного момента, а не старый
+    кадр из буфера драйвера, и не ждет чтения кадра после задержки шага.
+    """
+    def __init__(self, camera):
+        super().__init__(name="camera-grab", daemon=True)
+        self.camera = camera
+        self._condition = threading.Condition()
+        self._frame = None
+        self._counter = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            frame = self.camera.get_frame()
+            if frame is None:
+                time.sleep(0.005)
+                continue
+            with self._condition:
+                self._frame = frame
+                self._counter += 1
+                self._condition.notify_all()
+
+    @property
+    def frame_counter(self):
+        """Количество кадров, полученных с начала захвата."""
+        with self._condition:
+            return self._counter
+
+    def wait_for_frame_after(self, counter, timeout=None):
+        """
+        Ждет кадр с номером больше counter и возвращает самый свежий.
+        Возвращает None, если за timeout секунд новый кадр не пришел.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._counter > counter, timeout):
+                return None
+            return self._frame
+
+    def stop(self):
+        """Останавливает поток и дожидается его завершения."""
+        self._stop_event.set()
+        self.join()
+
+
 class ArduinoController:
     """Управляет соединением и отправкой команд на Arduino."""
     def __init__(self):
@@ -276,14 +324,17 @@ class ArduinoController:
         except Exception as e:
             print(f"Ошибка инициализации пинов: {e}")
         
-    def send_step_command(self, step_index):
+    def send_step_command(self, step_index, ack_timeout=None):
         """
         Отправляет команду для выполнения шага сдвига фазы.
         Реализует логику функции step() из Java версии.
+        Если задан ack_timeout (в секундах) и соединение serial, ждет от прошивки
+        config.ARDUINO_STEP_ACK_TOKEN - подтверждение, что шаг выполнен и сдвиг установился.
+        Возвращает True, если подтверждение получено.
         """
         if not self.is_connected:
             print("Arduino не подключен.")
-            return
+            return False
         
         try:
             # Сначала все LOW
@@ -298,6 +349,9 @@ class ArduinoController:
                 else:
                     print(f"Неверный индекс шага: {step_index}")
             elif self._mode == 'serial' and self.ser:
+                if ack_timeout is not None:
+                    # Старые ответы в буфере не должны сойти за подтверждение этого шага
+                    self.ser.reset_input_buffer()
                 for pin in range(2, 11):
                     command = f"DIGITAL:{pin}:LOW\n".encode('utf-8')
                     self.ser.write(command)
@@ -307,6 +361,8 @@ class ArduinoController:
                     self.ser.write(command)
                     self.current_step = step_index
                     print(f"Выполнен шаг {step_index}, пин {target_pin} HIGH (serial)")
+                    if ack_timeout is not None:
+                        return self._wait_step_ack(ack_timeout)
                 else:
                     print(f"Неверный индекс шага: {step_index}")
             else:
@@ -314,6 +370,18 @@ class ArduinoController:
                 
         except Exception as e:
             print(f"Ошибка отправки команды шага: {e}")
+        return False
+
+    def _wait_step_ack(self, timeout):
+        """Ждет подтверждение шага не дольше timeout секунд."""
+        token = config.ARDUINO_STEP_ACK_TOKEN
+        old_timeout = self.ser.timeout
+        self.ser.timeout = timeout
+        try:
+            reply = self.ser.read_until(token)
+        finally:
+            self.ser.timeout = old_timeout
+        return reply.endswith(token)
     
     def reset_all_pins(self):
         """Сбрасывает все пины в LOW состояние."""
@@ -42,3 +42,29 @@ def test_blink_serial_sequence_default_pin():
         f"DIGITAL:{config.BLINK_PIN}:LOW\n",
     ]
 
+
+class DummyAckSerial(DummySerial):
+    def __init__(self, reply):
+        super().__init__()
+        self.reply = reply
+        self.timeout = 1
+
+    def reset_input_buffer(self):
+        pass
+
+    def read_until(self, expected):
+        return self.reply
+
+
+def test_step_command_waits_for_ack():
+    ctrl = ArduinoController()
+    ctrl.is_connected = True
+    ctrl._mode = 'serial'
+    ctrl.ser = DummyAckSerial(config.ARDUINO_STEP_ACK_TOKEN)
+    assert ctrl.send_step_command(1, ack_timeout=0.1) is True
+    assert ctrl.ser.writes[-1] == b"DIGITAL:3:HIGH\n"
+    assert ctrl.ser.timeout == 1
+
+    ctrl.ser = DummyAckSerial(b"")
+    assert ctrl.send_step_command(1, ack_timeout=0.1) is False
+    assert ctrl.send_step_command(1) is False
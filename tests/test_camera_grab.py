@@ -0,0 +1,38 @@
+import numpy as np
+from hardware.controller import CameraGrabThread
+
+
+class DummyCamera:
+    def __init__(self):
+        self.count = 0
+
+    def get_frame(self):
+        self.count += 1
+        return np.full((2, 3), self.count % 256, dtype=np.uint8)
+
+
+def test_wait_for_frame_after_returns_newer_frame():
+    grabber = CameraGrabThread(DummyCamera())
+    grabber.start()
+    try:
+        first = grabber.wait_for_frame_after(0, timeout=1.0)
+        counter = grabber.frame_counter
+        frame = grabber.wait_for_frame_after(counter, timeout=1.0)
+        assert first is not None and frame is not None
+        assert grabber.frame_counter > counter
+    finally:
+        grabber.stop()
+    assert not grabber.is_alive()
+
+
+def test_wait_for_frame_after_times_out_without_frames():
+    class NoFrames:
+        def get_frame(self):
+            return None
+
+    grabber = CameraGrabThread(NoFrames())
+    grabber.start()
+    try:
+        assert grabber.wait_for_frame_after(grabber.frame_counter, timeout=0.05) is None
+    finally:
+        grabber.stop()
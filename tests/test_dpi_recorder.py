@@ -0,0 +1,256 @@
+import numpy as np
+
+
+def test_recording_npy_format(tmp_path):
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path), {'data_format': 'NPY', 'steps': 4})
+    frames = [np.full((4, 5), i, dtype=np.float32) for i in range(3)]
+    for frame in frames:
+        rec.save_phase_data(frame)
+    rec.stop_recording(wait=True)
+    assert rec.image_count == 3
+    saved = {}
+    for path in tmp_path.glob("test*.npz"):
+        with np.load(path) as archive:
+            saved.update({key: archive[key] for key in archive.files})
+    assert sorted(saved) == ["test1", "test2", "test3"]
+    for i, frame in enumerate(frames, start=1):
+        np.testing.assert_array_equal(saved[f"test{i}"], frame)
+    assert (tmp_path / "values.txt").exists()
+
+
+def test_recording_bin_stream(tmp_path):
+    import struct
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path), {'data_format': 'BIN'})
+    frames = [np.arange(12, dtype=np.float32).reshape(3, 4) + i for i in range(3)]
+    for frame in frames:
+        rec.save_phase_data(frame)
+    rec.stop_recording(wait=True)
+    raw = (tmp_path / "frames.bin").read_bytes()
+    offset = 0
+    for frame in frames:
+        rows, cols = struct.unpack_from('<II', raw, offset)
+        offset += 8
+        data = np.frombuffer(raw, dtype=np.float32, count=rows * cols, offset=offset)
+        offset += data.nbytes
+        np.testing.assert_array_equal(data.reshape(rows, cols), frame)
+    assert offset == len(raw)
+
+
+def test_save_phase_data_drops_when_queue_full(monkeypatch):
+    import config
+    from core.dpi_recorder import DPIRecorder
+    monkeypatch.setattr(config, 'DPI_QUEUE_SIZE', 1)
+    rec = DPIRecorder()
+    errors = []
+    rec.error_occurred.connect(errors.append)
+    rec.is_recording = True
+    frame = np.zeros((2, 2), dtype=np.float32)
+    rec.save_phase_data(frame)
+    rec.save_phase_data(frame)
+    rec.save_phase_data(frame)
+    assert rec._queue.qsize() == 1
+    assert rec.dropped_frames == 2
+    # Одно сообщение на серию пропусков
+    assert len(errors) == 1
+    rec._queue.get_nowait()
+    rec.save_phase_data(frame)
+    rec.save_phase_data(frame)
+    assert rec.dropped_frames == 3
+    assert len(errors) == 2
+
+
+def test_recording_stopped_reports_dropped_frames(tmp_path):
+    from PySide6.QtCore import Qt
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    stopped = []
+    rec.recording_stopped.connect(stopped.append, Qt.DirectConnection)
+    assert rec.start_recording(str(tmp_path))
+    rec.dropped_frames = 4
+    rec.stop_recording(wait=True)
+    assert stopped == [4]
+    lines = (tmp_path / "values.txt").read_text(encoding='utf-8').splitlines()
+    assert lines[-1] == "Dropped: 4"
+
+
+def test_recording_saves_phase_image(tmp_path):
+    import cv2
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path))
+    image = np.random.randint(0, 255, (6, 8, 3), dtype=np.uint8)
+    rec.save_phase_data(np.zeros((6, 8), dtype=np.float32), image)
+    rec.stop_recording(wait=True)
+    np.testing.assert_array_equal(cv2.imread(str(tmp_path / "test1.png")), image)
+    assert (tmp_path / "test1.csv").exists()
+
+
+def test_values_file_format(tmp_path):
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    rec.output_directory = str(tmp_path)
+    rec.image_count = 5
+    rec.params = {'steps': 4, 'lambda_angstrom': 6328.0, 'threshold': 0.8, 'delay': 200}
+    rec.create_values_file()
+    lines = (tmp_path / "values.txt").read_text(encoding='utf-8').splitlines()
+    assert lines == [
+        "Time ms: 0",
+        "Quantity: 5",
+        "Algorythm: 4 step",
+        "Wavelagth: 6328.0",
+        "Threshold: 0.8",
+        "Delay: 200",
+    ]
+
+
+def test_images_saved_batch_signal(tmp_path):
+    from PySide6.QtCore import Qt
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    batches = []
+    # Сигнал испускается из потока записи, а цикла событий в тесте нет
+    rec.images_saved_batch.connect(batches.append, Qt.DirectConnection)
+    assert rec.start_recording(str(tmp_path))
+    for i in range(3):
+        rec.save_phase_data(np.full((2, 2), i, dtype=np.float32))
+    rec.stop_recording(wait=True)
+    saved = [item for batch in batches for item in batch]
+    assert [num for num, _ in saved] == [1, 2, 3]
+    assert saved[-1][1].endswith("test3.csv")
+
+
+def test_recording_raw_mmap(tmp_path, monkeypatch):
+    import config
+    from core.dpi_recorder import DPIRecorder
+    monkeypatch.setattr(config, 'DPI_RAW_PREALLOC_FRAMES', 2)
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path), {'data_format': 'RAW'})
+    frames = [np.random.rand(3, 5).astype(np.float32) for _ in range(5)]
+    for frame in frames:
+        rec.save_phase_data(frame)
+    rec.stop_recording(wait=True)
+    data = np.fromfile(tmp_path / "frames.raw", dtype=np.float32).reshape(-1, 3, 5)
+    np.testing.assert_array_equal(data, np.stack(frames))
+    index = (tmp_path / "frames_index.txt").read_text(encoding='utf-8').splitlines()
+    assert index[:3] == ["Frames: 5", "Rows: 3", "Cols: 5"]
+
+
+def test_npy_keeps_float64_and_bin_narrows(tmp_path):
+    import struct
+    from core.dpi_recorder import DPIRecorder
+    frame = np.random.rand(3, 4)
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path / "npy"), {'data_format': 'NPY'})
+    rec.save_phase_data(frame)
+    rec.stop_recording(wait=True)
+    with np.load(tmp_path / "npy" / "test1-1.npz") as archive:
+        assert archive["test1"].dtype == np.float64
+        np.testing.assert_array_equal(archive["test1"], frame)
+    assert rec.start_recording(str(tmp_path / "bin"), {'data_format': 'BIN'})
+    rec.save_phase_data(frame)
+    rec.stop_recording(wait=True)
+    raw = (tmp_path / "bin" / "frames.bin").read_bytes()
+    assert struct.unpack_from('<II', raw) == (3, 4)
+    assert len(raw) == 8 + frame.size * 4
+
+
+def test_writer_pool_shut_down_after_recording(tmp_path):
+    import threading
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path))
+    rec.save_phase_data(np.zeros((2, 2), dtype=np.float32))
+    rec.stop_recording(wait=True)
+    assert rec._executor is None
+    assert not [t for t in threading.enumerate() if t.name.startswith("dpi-writer_")]
+
+
+def test_recording_saves_compressed_qimage(tmp_path):
+    import cv2
+    from PySide6.QtGui import QImage
+    from core.dpi_recorder import DPIRecorder
+    gradient = np.tile(np.arange(256, dtype=np.uint8), (64, 1))
+    image = np.ascontiguousarray(np.dstack([gradient, gradient // 2, 255 - gradient]))
+    qimage = QImage(image.data, 256, 64, 256 * 3, QImage.Format_BGR888).copy()
+    rec = DPIRecorder()
+    assert rec.start_recording(str(tmp_path))
+    rec.save_phase_data(np.zeros((64, 256), dtype=np.float32), qimage)
+    rec.stop_recording(wait=True)
+    path = tmp_path / "test1.png"
+    np.testing.assert_array_equal(cv2.imread(str(path)), image)
+    # Без сжатия PNG занимает не меньше объёма пикселей
+    assert path.stat().st_size < image.nbytes // 4
+
+
+def test_writer_error_stops_recording(tmp_path):
+    from PySide6.QtCore import Qt
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    errors = []
+    stopped = []
+    rec.error_occurred.connect(errors.append, Qt.DirectConnection)
+    rec.recording_stopped.connect(stopped.append, Qt.DirectConnection)
+    assert rec.start_recording(str(tmp_path))
+    # format_csv не принимает 3-D массив и бросает ValueError, а не OSError
+    rec.save_phase_data(np.zeros((2, 2, 2), dtype=np.float32))
+    rec._writer_thread.join(timeout=5)
+    rec._finalizer.join(timeout=5)
+    assert not rec._writer_thread.is_alive()
+    assert not rec.is_recording
+    assert len(errors) == 1
+    assert stopped == [0]
+    # Новая запись после ошибки работает
+    assert rec.start_recording(str(tmp_path / "next"))
+    rec.save_phase_data(np.zeros((2, 2), dtype=np.float32))
+    rec.stop_recording(wait=True)
+    assert (tmp_path / "next" / "test1.csv").exists()
+
+
+def test_writev_all_handles_partial_writes(monkeypatch):
+    import os
+    from core import dpi_recorder
+    out = bytearray()
+
+    def short_writev(fd, buffers):
+        # Записывает не больше 5 байт за вызов
+        data = b''.join(bytes(b) for b in buffers)[:5]
+        out.extend(data)
+        return len(data)
+
+    monkeypatch.setattr(os, 'writev', short_writev, raising=False)
+    frame = np.arange(6, dtype=np.float32)
+    dpi_recorder._writev_all(0, [b'head', memoryview(frame).cast('B'), b'', b'tail'])
+    assert bytes(out) == b'head' + frame.tobytes() + b'tail'
+
+
+def test_writer_error_after_stop_finalizes_once(tmp_path):
+    import threading
+    from PySide6.QtCore import Qt
+    from core.dpi_recorder import DPIRecorder
+    rec = DPIRecorder()
+    stopped = []
+    errors = []
+    rec.recording_stopped.connect(stopped.append, Qt.DirectConnection)
+    rec.error_occurred.connect(errors.append, Qt.DirectConnection)
+    stop_requested = threading.Event()
+
+    def failing_batch(batch, first_num):
+        stop_requested.wait(5)
+        raise RuntimeError("сбой записи")
+
+    rec._save_phase_batch = failing_batch
+    assert rec.start_recording(str(tmp_path), {'data_format': 'BIN'})
+    rec.save_phase_data(np.zeros((2, 2), dtype=np.float32))
+    rec.stop_recording()
+    finalizer = rec._finalizer
+    stop_requested.set()
+    rec.stop_recording(wait=True)
+    rec._writer_thread.join(timeout=5)
+    assert rec._finalizer is finalizer
+    assert not finalizer.is_alive()
+    assert stopped == [0]
+    assert len(errors) == 1
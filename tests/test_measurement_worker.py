@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+
+def _worker(**params):
+    from gui.main_window import MeasurementWorker
+    base = {'steps': 4, 'delay': 0, 'lambda_angstrom': 6328.0, 'threshold': 0.8, 'unwrap': True}
+    base.update(params)
+    return MeasurementWorker(None, None, base)
+
+
+@pytest.mark.parametrize("scale", [True, False])
+def test_gpu_unwrap_checkbox_routes_to_unwrap_phase_gpu(scale):
+    from PySide6.QtCore import Qt
+    worker = _worker(gpu_unwrap=True, scale=scale)
+    calls = []
+    unwrapped = np.full((6, 8), 2 * np.pi, dtype=np.float32)
+
+    def fake_unwrap(wrapped):
+        calls.append(wrapped.shape)
+        return unwrapped
+
+    worker.processor.unwrap_phase_gpu = fake_unwrap
+    worker.processor.threshold_unwrap = lambda *a, **k: pytest.fail("threshold_unwrap не должна вызываться")
+    phase = []
+    worker.phase_data_ready.connect(phase.append, Qt.DirectConnection)
+    rng = np.random.default_rng(0)
+    worker._process_series(rng.integers(0, 256, (4, 6, 8)).astype(np.float32))
+    assert calls == [(6, 8)]
+    expected = worker.processor.scale_phase(unwrapped) if scale else unwrapped
+    np.testing.assert_allclose(phase[0], expected)
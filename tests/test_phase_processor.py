@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import core.phase_processor as phase_processor
+from core.phase_processor import PhaseProcessor
+
+
+def _wrapped_ramp(rows=64, cols=80, lam=7500.0):
+    y, x = np.mgrid[0:rows, 0:cols]
+    surface = (x * 0.3 + y * 0.2) * lam / 8.0
+    return (np.mod(surface, 0.5 * lam)).astype(np.float32)
+
+
+def test_threshold_unwrap_numba_matches_numpy(monkeypatch):
+    pytest.importorskip("numba")
+    proc = PhaseProcessor()
+    h = _wrapped_ramp()
+    fast = proc.threshold_unwrap(h, iterations=2)
+    monkeypatch.setattr(phase_processor, 'HAS_NUMBA', False)
+    reference = proc.threshold_unwrap(h, iterations=2)
+    np.testing.assert_allclose(fast, reference, atol=1e-2)
+
+
+@pytest.mark.parametrize("steps", [3, 4, 5])
+def test_compute_phase_matches_formulas(steps):
+    rng = np.random.default_rng(steps)
+    I = rng.integers(0, 256, (steps, 24, 32)).astype(np.float64)
+    s3 = np.sqrt(3)
+    if steps == 3:
+        num, den = 2 * I[0] - 3 * I[1] + I[2], s3 * (I[1] - I[2])
+    elif steps == 4:
+        num, den = 5 * (I[0] - I[1] - I[2] + I[3]), s3 * (2 * I[0] + I[1] - I[2] - 2 * I[3])
+    else:
+        num, den = s3 * (2 * I[0] - 3 * I[1] - 4 * I[2] + 5 * I[4]), 8 * I[0] + 3 * I[1] - 4 * I[2] - 6 * I[3] - I[4]
+    phase = PhaseProcessor().compute_phase([img.astype(np.uint8) for img in I], steps)
+    assert phase.dtype == np.float32
+    # Сравнение по модулю 2*pi: на разрезе arctan2 значения могут отличаться на период
+    np.testing.assert_allclose(np.angle(np.exp(1j * (phase - np.arctan2(num, den)))), 0, atol=1e-4)
+
+
+def test_tile_unwrap_thread_pool_matches_serial(monkeypatch):
+    rng = np.random.default_rng(0)
+    h = _wrapped_ramp(100, 130) + rng.normal(0, 200, (100, 130)).astype(np.float32)
+    monkeypatch.setattr(phase_processor.config, 'PHASE_TILE_WORKERS', 1)
+    serial = PhaseProcessor().tile_unwrap(h.copy(), delimeter=16)
+    monkeypatch.setattr(phase_processor.config, 'PHASE_TILE_WORKERS', 4)
+    parallel = PhaseProcessor().tile_unwrap(h.copy(), delimeter=16)
+    np.testing.assert_array_equal(parallel, serial)
+
+
+@pytest.mark.parametrize("steps", [3, 4, 5])
+def test_compute_phase_uniform_frames_give_zero_phase(steps):
+    # Одинаковые кадры дают числитель и знаменатель 0: arctan2(0, 0) должен вернуть 0, а не NaN
+    images = np.full((steps, 8, 8), 200, dtype=np.float64)
+    phase = PhaseProcessor().compute_phase(images, steps)
+    assert phase.dtype == np.float32
+    assert np.all(phase == 0)
+
+
+def test_special_unwrap_numba_matches_numpy(monkeypatch):
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(1)
+    p = _wrapped_ramp(70, 90) + rng.normal(0, 200, (70, 90)).astype(np.float32)
+    tiles_mask = rng.random((70 // 16, 90 // 16)) < 0.4
+    proc = PhaseProcessor()
+    fast = proc.special_unwrap(p.copy(), tiles_mask, 16)
+    monkeypatch.setattr(phase_processor, 'HAS_NUMBA', False)
+    reference = proc.special_unwrap(p.copy(), tiles_mask, 16)
+    np.testing.assert_allclose(fast, reference, atol=1e-2)
+
+
+def test_tiled_unwrap_phase_matches_full():
+    y, x = np.mgrid[0:120, 0:160]
+    surface = ((x - 80) ** 2 + (y - 60) ** 2) / 300.0 + x * 0.05
+    wrapped = np.angle(np.exp(1j * surface)).astype(np.float32)
+    proc = PhaseProcessor()
+    full = proc.unwrap_phase(wrapped)
+    tiled = proc.unwrap_phase(wrapped, ntiles=(3, 2), overlap=8)
+    # Развёртка определена с точностью до постоянного сдвига на 2*pi*k
+    offset = np.round((tiled - full).mean() / (2 * np.pi)) * 2 * np.pi
+    np.testing.assert_allclose(tiled - offset, full, atol=1e-6)
+
+
+@pytest.mark.parametrize("sigma", [50, 1500])
+def test_phase_jump_numba_matches_numpy(monkeypatch, sigma):
+    pytest.importorskip("numba")
+    tile = np.random.default_rng(sigma).normal(0, sigma, (32, 32)).astype(np.float32)
+    proc = PhaseProcessor()
+    fast = proc.phase_jump(tile)
+    monkeypatch.setattr(phase_processor, 'HAS_NUMBA', False)
+    assert fast == proc.phase_jump(tile)
+
+
+def test_fft_unwrap_matches_unwrap_phase(monkeypatch):
+    y, x = np.mgrid[0:90, 0:110]
+    surface = ((x - 55) ** 2 + (y - 45) ** 2) / 250.0 + y * 0.07
+    wrapped = np.angle(np.exp(1j * surface)).astype(np.float32)
+    proc = PhaseProcessor()
+    full = proc.unwrap_phase(wrapped)
+    fft = proc._fft_unwrap(np, wrapped)
+    offset = np.round((fft - full).mean() / (2 * np.pi)) * 2 * np.pi
+    np.testing.assert_allclose(fft - offset, full, atol=1e-5)
+    # Без CuPy развёртка на GPU возвращается к unwrap_phase на CPU
+    monkeypatch.setattr(phase_processor, 'HAS_CUPY', False)
+    np.testing.assert_array_equal(proc.unwrap_phase_gpu(wrapped), full)
@@ -0,0 +1,97 @@
+import io
+import numpy as np
+import pytest
+from core.visualizer import load_colormap, create_phase_image, create_interferogram, format_csv
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["FFFF8000", "ff0a0b0c"], [[0, 128, 255], [12, 11, 10]]),  # AARRGGBB
+    (["FF8000", "0a0B0c"], [[0, 128, 255], [12, 11, 10]]),      # RRGGBB
+])
+def test_load_colormap_parses_hex_to_bgr(tmp_path, lines, expected):
+    path = tmp_path / "colors.csv"
+    path.write_text("\n".join(lines) + "\n")
+    colormap = load_colormap(str(path))
+    assert colormap.dtype == np.uint8
+    np.testing.assert_array_equal(colormap, expected)
+
+
+@pytest.mark.parametrize("inverse", [False, True])
+def test_create_phase_image_maps_range_to_palette(inverse):
+    colormap = np.stack([np.arange(256, dtype=np.uint8)] * 3, axis=1)
+    phase = np.linspace(-100.0, 100.0, 256).reshape(16, 16)
+    scratch = np.empty(phase.shape, dtype=np.uint16)
+    index_scratch = np.empty(phase.shape, dtype=np.intp)
+    image = create_phase_image(phase, colormap, inverse=inverse, scratch=scratch, index_scratch=index_scratch)
+    np.testing.assert_array_equal(index_scratch, scratch)
+    expected = np.arange(256).reshape(16, 16)
+    if inverse:
+        expected = 255 - expected
+    assert image.shape == (16, 16, 3)
+    np.testing.assert_array_equal(image[..., 0], expected)
+
+
+def test_create_interferogram_average_matches_mean():
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (8, 10), dtype=np.uint8) for _ in range(5)]
+    result = create_interferogram(images, 'average')
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, np.mean(images, axis=0).astype(np.uint8))
+
+
+def test_format_csv_matches_savetxt():
+    data = (np.random.rand(12, 7) * 9000.0 - 4000.0).astype(np.float32)
+    expected = io.StringIO()
+    np.savetxt(expected, data, fmt='%.6f', delimiter=',')
+    assert format_csv(data, fmt='%.6f', delimiter=',') == expected.getvalue().encode('ascii')
+
+
+def test_save_image_as_csv_rounds_to_int(tmp_path):
+    from core.visualizer import save_image_as_csv
+    image = np.array([[0.4, 1.6], [-2.5, 254.5]])
+    ok, path = save_image_as_csv(image, str(tmp_path / "frame.csv"))
+    assert ok
+    assert (tmp_path / "frame.csv").read_text() == "0,2\n-2,254\n"
+
+
+def test_load_colormap_is_cached_and_read_only():
+    first = load_colormap("data/colorArray.csv")
+    assert load_colormap("data/colorArray.csv") is first
+    assert not first.flags.writeable
+
+
+@pytest.mark.parametrize("inverse", [False, True])
+def test_create_phase_image_gray_numba_matches_numpy(monkeypatch, inverse):
+    pytest.importorskip("numba")
+    import core.visualizer as visualizer
+    phase = np.random.default_rng(3).normal(0, 2000, (40, 50))
+    fast = visualizer.create_phase_image_gray(phase, inverse=inverse)
+    monkeypatch.setattr(visualizer, 'HAS_NUMBA', False)
+    reference = visualizer.create_phase_image_gray(phase, inverse=inverse)
+    assert fast.dtype == np.uint8
+    np.testing.assert_array_equal(fast, reference)
+
+
+def test_constant_phase_returns_cached_blank_frame():
+    import core.visualizer as visualizer
+    phase = np.full((6, 7), 3.5, dtype=np.float32)
+    colormap = np.zeros((4, 3), dtype=np.uint8)
+    color = create_phase_image(phase, colormap)
+    gray = visualizer.create_phase_image_gray(phase)
+    assert color.shape == (6, 7, 3) and gray.shape == (6, 7)
+    assert not color.any() and not gray.any()
+    assert not color.flags.writeable
+    assert create_phase_image(phase, colormap) is color
+
+
+def test_load_colormap_reloads_changed_file(tmp_path):
+    import os
+    path = tmp_path / "colors.csv"
+    path.write_text("FF000000\n")
+    first = load_colormap(str(path))
+    path.write_text("FFFFFFFF\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = load_colormap(str(path))
+    assert reloaded is not first
+    np.testing.assert_array_equal(reloaded, [[255, 255, 255]])